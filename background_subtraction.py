@@ -1,7 +1,370 @@
 import cv2
+import numpy as np
 import tkinter as tk
 from tkinter import filedialog, ttk
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
 import os
+import queue
+import struct
+import sys
+import threading
+import time
+import zlib
+
+
+MASK_EXTENSION = '.fgm'
+MASK_MAGIC = b'FGMASK01'
+MASK_HEADER = struct.Struct('<8sIII')  # magic, width, height, compressed
+MASK_FOOTER = struct.Struct('<QQ')  # index offset, frame count
+MASK_INDEX_DTYPE = np.dtype([('offset', '<u8'), ('length', '<u4')])
+
+
+class MaskWriter:
+    """Writes binary foreground masks to a compact, randomly accessible .fgm file.
+
+    Each frame is stored as one bit per pixel (255 -> 1, anything else, including
+    MOG2's grey shadow pixels, -> 0), optionally zlib-compressed. An index of
+    frame offsets is appended at the end, followed by a fixed-size footer, so a
+    reader can jump straight to any frame.
+    """
+
+    def __init__(self, path, width, height, compress=True):
+        self.file = open(path, 'wb')
+        self.width = width
+        self.height = height
+        self.compress = compress
+        self.index = []
+        self.file.write(MASK_HEADER.pack(MASK_MAGIC, width, height, int(compress)))
+
+    def write(self, mask):
+        bits = np.packbits(mask.reshape(-1) == 255).tobytes()
+        if self.compress:
+            bits = zlib.compress(bits, 1)
+        self.index.append((self.file.tell(), len(bits)))
+        self.file.write(bits)
+
+    def release(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=MASK_INDEX_DTYPE).tobytes())
+        self.file.write(MASK_FOOTER.pack(index_offset, len(self.index)))
+        self.file.close()
+
+
+class MaskReader:
+    """Memory-maps a .fgm file and decodes frames on demand as uint8 masks of 0/255."""
+
+    def __init__(self, path):
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, self.width, self.height, self.compressed = MASK_HEADER.unpack_from(self.data, 0)
+        if magic != MASK_MAGIC:
+            raise ValueError("{} is not a foreground mask file".format(path))
+        index_offset, frame_count = MASK_FOOTER.unpack_from(self.data, len(self.data) - MASK_FOOTER.size)
+        self.index = np.frombuffer(self.data, dtype=MASK_INDEX_DTYPE, count=frame_count, offset=index_offset)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, frame_index):
+        if frame_index < 0:
+            frame_index += len(self.index)
+        if not 0 <= frame_index < len(self.index):
+            raise IndexError("frame index out of range")
+        offset, length = self.index[frame_index]
+        bits = self.data[offset:offset + length]
+        if self.compressed:
+            bits = np.frombuffer(zlib.decompress(bits), dtype=np.uint8)
+        mask = np.unpackbits(bits, count=self.width * self.height)
+        return (mask * 255).reshape(self.height, self.width)
+
+    def __iter__(self):
+        for frame_index in range(len(self.index)):
+            yield self[frame_index]
+
+    def close(self):
+        self.data._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_mask_writer(output_path, fps, frame_size):
+    """Open a .fgm mask container or, for any other extension, a greyscale mp4v video."""
+    if output_path.lower().endswith(MASK_EXTENSION):
+        return MaskWriter(output_path, *frame_size)
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, frame_size, isColor=False)
+    if not out.isOpened():
+        raise IOError("could not open {} for writing".format(output_path))
+    return out
+
+
+class StageTimer:
+    """Counts the frames a pipeline stage handled and the time it spent working on them."""
+
+    def __init__(self):
+        self.frames = 0
+        self.busy = 0.0
+
+    def add(self, seconds):
+        self.frames += 1
+        self.busy += seconds
+
+    def fps(self):
+        return self.frames / self.busy if self.busy else 0.0
+
+
+class SubtractionPipeline:
+    """MOG2 background subtraction split into reader, apply and writer threads.
+
+    The stages are joined by bounded queues so decoding, subtraction and encoding
+    overlap. Display is not a stage: the apply thread only publishes its latest
+    result, which a viewer may pick up at whatever rate it likes.
+
+    MOG2 can be run on a downscaled frame (scale < 1) and/or only inside a list of
+    polygon regions of interest given in full-frame pixel coordinates. Masks stay
+    at the working resolution until the writer maps them back to full frame.
+    """
+
+    def __init__(self, video_path, output_path=None, queue_size=32, keep_latest=False, scale=1.0, rois=None,
+                 max_frames=None):
+        self.cap = cv2.VideoCapture(video_path)
+        self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+
+        self.back_sub = cv2.createBackgroundSubtractorMOG2()
+        self.output_path = output_path
+        self.keep_latest = keep_latest
+        self.max_frames = max_frames
+        self._setup_work_area(scale, rois)
+
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.mask_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.latest_lock = threading.Lock()
+        self.latest = None
+        self.error = None
+
+        self.timers = {"read": StageTimer(), "apply": StageTimer(), "write": StageTimer()}
+        self.frames_done = 0
+        self.foreground_pixels = 0
+        self.start_time = None
+        self.end_time = None
+        self.threads = []
+
+    def _setup_work_area(self, scale, rois):
+        """Work out the crop, working size and ROI mask the subtractor runs on."""
+        self.crop = (0, 0, self.frame_width, self.frame_height)
+        if rois:
+            polygons = [np.asarray(polygon, dtype=np.int32).reshape(-1, 2) for polygon in rois]
+            x, y, w, h = cv2.boundingRect(np.concatenate(polygons))
+            x, y = max(x, 0), max(y, 0)
+            w, h = min(w, self.frame_width - x), min(h, self.frame_height - y)
+            self.crop = (x, y, w, h)
+
+        x, y, w, h = self.crop
+        self.work_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+
+        self.roi_mask = None
+        if rois:
+            roi_mask = np.zeros((h, w), np.uint8)
+            cv2.fillPoly(roi_mask, [polygon - (x, y) for polygon in polygons], 255)
+            if self.work_size != (w, h):
+                roi_mask = cv2.resize(roi_mask, self.work_size, interpolation=cv2.INTER_NEAREST)
+            self.roi_mask = roi_mask
+
+        # Each working pixel stands for this many full-frame pixels
+        self.pixel_weight = (w * h) / (self.work_size[0] * self.work_size[1])
+
+    def prepare_frame(self, frame):
+        """Crop and downscale a full frame to what the subtractor works on."""
+        x, y, w, h = self.crop
+        if self.crop != (0, 0, self.frame_width, self.frame_height):
+            frame = frame[y:y + h, x:x + w]
+        if self.work_size != (w, h):
+            frame = cv2.resize(frame, self.work_size, interpolation=cv2.INTER_AREA)
+        return frame
+
+    def full_resolution(self, fg_mask):
+        """Map a working-resolution mask back onto the full frame."""
+        x, y, w, h = self.crop
+        if self.work_size != (w, h):
+            fg_mask = cv2.resize(fg_mask, (w, h), interpolation=cv2.INTER_NEAREST)
+        if self.crop != (0, 0, self.frame_width, self.frame_height):
+            full_mask = np.zeros((self.frame_height, self.frame_width), np.uint8)
+            full_mask[y:y + h, x:x + w] = fg_mask
+            fg_mask = full_mask
+        return fg_mask
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        targets = [self._read_loop, self._apply_loop]
+        if self.output_path:
+            targets.append(self._write_loop)
+        self.threads = [threading.Thread(target=target, daemon=True) for target in targets]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self.threads)
+
+    def join(self):
+        for thread in self.threads:
+            thread.join()
+        self.cap.release()
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+
+    def run(self):
+        """Process the whole video on the calling thread's behalf and return the stage report."""
+        self.start().join()
+        return self.report()
+
+    def get_latest(self):
+        """Return the most recent (frame, mask) pair, or None if nothing new was produced."""
+        with self.latest_lock:
+            latest, self.latest = self.latest, None
+        return latest
+
+    def report(self):
+        elapsed = (self.end_time or time.perf_counter()) - self.start_time
+        stages = {name: {"frames": timer.frames, "busy_seconds": round(timer.busy, 3), "fps": round(timer.fps(), 1)}
+                  for name, timer in self.timers.items() if timer.frames}
+        frame_pixels = self.frames_done * self.frame_width * self.frame_height
+        foreground_pixels = self.foreground_pixels * self.pixel_weight
+        return {"frames": self.frames_done, "seconds": round(elapsed, 3),
+                "fps": round(self.frames_done / elapsed, 1) if elapsed else 0.0,
+                "foreground_ratio": round(foreground_pixels / frame_pixels, 5) if frame_pixels else 0.0,
+                "stages": stages}
+
+    def _put(self, target_queue, item):
+        # Block while the next stage is busy, but give up as soon as the pipeline is stopped
+        while not self.stop_event.is_set():
+            try:
+                target_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source_queue):
+        while not self.stop_event.is_set():
+            try:
+                return source_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def _read_loop(self):
+        try:
+            frames_read = 0
+            while not self.stop_event.is_set() and frames_read != self.max_frames:
+                start = time.perf_counter()
+                ret, frame = self.cap.read()
+                frames_read += 1
+                if not ret:
+                    break
+                self.timers["read"].add(time.perf_counter() - start)
+                if not self._put(self.frame_queue, frame):
+                    break
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self._put(self.frame_queue, None)
+
+    def _apply_loop(self):
+        try:
+            while True:
+                frame = self._get(self.frame_queue)
+                if frame is None:
+                    break
+
+                # Apply background subtraction
+                start = time.perf_counter()
+                fg_mask = self.back_sub.apply(self.prepare_frame(frame))
+                if self.roi_mask is not None:
+                    fg_mask = cv2.bitwise_and(fg_mask, self.roi_mask)
+                self.timers["apply"].add(time.perf_counter() - start)
+                # Shadows are marked 127 by MOG2; only count definite foreground
+                self.foreground_pixels += int(cv2.countNonZero(cv2.inRange(fg_mask, 255, 255)))
+
+                if self.output_path and not self._put(self.mask_queue, fg_mask):
+                    break
+                if self.keep_latest:
+                    with self.latest_lock:
+                        self.latest = (frame, fg_mask)
+                self.frames_done += 1
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self.end_time = time.perf_counter()
+            if self.output_path:
+                self._put(self.mask_queue, None)
+
+    def _write_loop(self):
+        out = None
+        try:
+            # Opening can fail too; it must stop the pipeline, or the other stages block on full queues
+            out = open_mask_writer(self.output_path, self.fps, (self.frame_width, self.frame_height))
+            while True:
+                fg_mask = self._get(self.mask_queue)
+                if fg_mask is None:
+                    break
+                start = time.perf_counter()
+                out.write(self.full_resolution(fg_mask))
+                self.timers["write"].add(time.perf_counter() - start)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            if out is not None:
+                out.release()
+            self.end_time = time.perf_counter()
+
+
+def parse_rois(text):
+    """Parse polygons written as 'x,y x,y x,y; x,y x,y x,y' into lists of points."""
+    rois = []
+    for polygon_text in text.split(';'):
+        if not polygon_text.strip():
+            continue
+        points = [tuple(int(value) for value in point.split(',')) for point in polygon_text.split()]
+        if len(points) < 3 or any(len(point) != 2 for point in points):
+            raise ValueError("each ROI needs at least three x,y points: '{}'".format(polygon_text.strip()))
+        rois.append(points)
+    return rois
+
+
+def compare_modes(video_path, scale=1.0, rois=None, max_frames=300):
+    """Time full-frame subtraction against the reduced mode on the first max_frames frames."""
+    full = SubtractionPipeline(video_path, max_frames=max_frames).run()
+    reduced = SubtractionPipeline(video_path, scale=scale, rois=rois, max_frames=max_frames).run()
+    full_fps = full["stages"].get("apply", {}).get("fps", 0.0)
+    reduced_fps = reduced["stages"].get("apply", {}).get("fps", 0.0)
+    return {"full": full, "reduced": reduced, "speedup": round(reduced_fps / full_fps, 2) if full_fps else 0.0}
+
+
+def print_comparison(comparison):
+    for mode in ("full", "reduced"):
+        report = comparison[mode]
+        print("{:<8} apply {:>8.1f} fps, overall {:>8.1f} fps, foreground {:.2%}".format(
+            mode, report["stages"].get("apply", {}).get("fps", 0.0), report["fps"], report["foreground_ratio"]))
+    print("Subtraction speedup: {}x".format(comparison["speedup"]))
 
 
 class BackgroundSubtractionApp:
@@ -36,16 +399,44 @@ class BackgroundSubtractionApp:
         self.save_video_checkbox = tk.Checkbutton(root, text="Save Processed Video", variable=self.save_video_var)
         self.save_video_checkbox.grid(row=2, column=1, padx=5, pady=5)
 
-        # Start and quit buttons
+        self.compact_mask_var = tk.BooleanVar(value=False)
+        self.compact_mask_checkbox = tk.Checkbutton(root, text="Compact Mask File (.fgm)",
+                                                    variable=self.compact_mask_var)
+        self.compact_mask_checkbox.grid(row=2, column=2, padx=5, pady=5)
+
+        # Options for reduced-resolution and region-of-interest processing
+        self.scale_label = tk.Label(root, text="Processing Scale:")
+        self.scale_label.grid(row=3, column=0, padx=5, pady=5)
+
+        self.scale_entry = tk.Entry(root, width=10)
+        self.scale_entry.insert(0, "1.0")
+        self.scale_entry.grid(row=3, column=1, padx=5, pady=5, sticky="w")
+
+        self.roi_label = tk.Label(root, text="ROI Polygons:")
+        self.roi_label.grid(row=4, column=0, padx=5, pady=5)
+
+        self.roi_entry = tk.Entry(root, width=50)
+        self.roi_entry.grid(row=4, column=1, padx=5, pady=5)
+
+        self.roi_hint = tk.Label(root, text="x,y x,y x,y; ...")
+        self.roi_hint.grid(row=4, column=2, padx=5, pady=5)
+
+        # Start, timing comparison and quit buttons
         self.start_button = tk.Button(root, text="Start", command=self.start_processing)
-        self.start_button.grid(row=3, column=1, columnspan=2, pady=5)
+        self.start_button.grid(row=5, column=1, columnspan=2, pady=5)
+
+        self.compare_button = tk.Button(root, text="Compare Timing", command=self.compare_timing)
+        self.compare_button.grid(row=5, column=0, pady=5)
 
         self.quit_button = tk.Button(root, text="Quit", command=root.quit)
-        self.quit_button.grid(row=4, column=1, columnspan=2, pady=5)
+        self.quit_button.grid(row=6, column=1, columnspan=2, pady=5)
 
         # Progress bar
         self.progress = ttk.Progressbar(root, orient="horizontal", length=400, mode="determinate")
-        self.progress.grid(row=5, column=0, columnspan=3, pady=10)
+        self.progress.grid(row=7, column=0, columnspan=3, pady=10)
+
+        self.pipeline = None
+        self.display_interval_ms = 40
 
     def browse_video(self):
         filename = filedialog.askopenfilename(title="Select Video File",
@@ -54,73 +445,240 @@ class BackgroundSubtractionApp:
             self.video_entry.delete(0, tk.END)
             self.video_entry.insert(0, filename)
 
-    def start_processing(self):
+    def get_video_path(self):
         video_path = self.video_entry.get()
         if not video_path:
-            return
+            return None
 
         # Check if video file exists
         if not os.path.isfile(video_path):
             print("Invalid file path")
-            return
+            return None
+        return video_path
 
-        # Start capturing the video
-        cap = cv2.VideoCapture(video_path)
+    def get_work_area(self):
+        """Read the scale and ROI options, returning None if they are malformed."""
+        try:
+            scale = float(self.scale_entry.get() or 1.0)
+            rois = parse_rois(self.roi_entry.get())
+        except ValueError as e:
+            print("Invalid processing options: {}".format(e))
+            return None
+        if not 0 < scale <= 1:
+            print("Processing scale must be between 0 and 1")
+            return None
+        return scale, rois
 
-        # Create Background Subtractor object
-        back_sub = cv2.createBackgroundSubtractorMOG2()
+    def compare_timing(self):
+        video_path = self.get_video_path()
+        work_area = self.get_work_area()
+        if self.pipeline is not None or video_path is None or work_area is None:
+            return
+        print_comparison(compare_modes(video_path, *work_area))
 
-        # Frame count for progress
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        self.progress["maximum"] = total_frames
+    def start_processing(self):
+        if self.pipeline is not None:
+            return
+
+        video_path = self.get_video_path()
+        work_area = self.get_work_area()
+        if video_path is None or work_area is None:
+            return
+        scale, rois = work_area
 
         # Video writer for saving processed video
-        save_video = self.save_video_var.get()
-        out = None
-        if save_video:
-            frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            fps = int(cap.get(cv2.CAP_PROP_FPS))
-            out = cv2.VideoWriter('out.mp4', cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height), isColor=False)
-
-        frame_index = 0
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Apply background subtraction
-            fg_mask = back_sub.apply(frame)
-
-            # Save frame to video if enabled
-            if save_video and out:
-                out.write(fg_mask)
-
-            # Display the video and/or the foreground mask based on user settings
+        output_path = None
+        if self.save_video_var.get():
+            output_path = 'out' + (MASK_EXTENSION if self.compact_mask_var.get() else '.mp4')
+
+        # Start the reader, subtraction and writer threads
+        self.pipeline = SubtractionPipeline(video_path, output_path=output_path, keep_latest=True,
+                                            scale=scale, rois=rois)
+        self.progress["maximum"] = self.pipeline.total_frames
+        self.progress["value"] = 0
+        self.start_button.configure(state=tk.DISABLED)
+        self.pipeline.start()
+        self.poll_pipeline()
+
+    def poll_pipeline(self):
+        """Show the newest result and update progress; runs on the Tk thread at display rate."""
+        pipeline = self.pipeline
+
+        # Display the video and/or the foreground mask based on user settings
+        latest = pipeline.get_latest()
+        if latest is not None:
+            frame, fg_mask = latest
             if self.show_original_var.get():
                 cv2.imshow('Original Frame', frame)
             if self.show_mask_var.get():
-                cv2.imshow('Foreground Mask', fg_mask)
+                cv2.imshow('Foreground Mask', pipeline.full_resolution(fg_mask))
 
-            # Update progress bar
-            frame_index += 1
-            self.progress["value"] = frame_index
-            self.root.update_idletasks()
+        # Update progress bar
+        self.progress["value"] = pipeline.frames_done
 
-            # Break on 'q' key press
-            if cv2.waitKey(30) & 0xFF == ord('q'):
-                break
+        # Stop on 'q' key press
+        if cv2.waitKey(1) & 0xFF == ord('q'):
+            pipeline.stop()
 
-        cap.release()
-        if out:
-            out.release()
+        if pipeline.is_running():
+            self.root.after(self.display_interval_ms, self.poll_pipeline)
+        else:
+            self.finish_processing()
+
+    def finish_processing(self):
+        pipeline, self.pipeline = self.pipeline, None
+        pipeline.join()
         cv2.destroyAllWindows()
+        self.start_button.configure(state=tk.NORMAL)
+
+        if pipeline.error:
+            print("Processing failed: {}".format(pipeline.error))
+        report = pipeline.report()
+        print("Processed {} frames in {}s ({} fps)".format(report["frames"], report["seconds"], report["fps"]))
+        for name, stage in report["stages"].items():
+            print("  {:<6} {:>8.1f} fps ({} frames)".format(name, stage["fps"], stage["frames"]))
+
+        if pipeline.output_path:
+            print("Processed video saved as '{}'".format(pipeline.output_path))
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v')
+
+
+def find_videos(inputs):
+    """Expand directories and glob patterns into a sorted list of video paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            matches = glob.glob(item)
+        paths.extend(path for path in matches
+                     if os.path.isfile(path) and path.lower().endswith(VIDEO_EXTENSIONS))
+    return sorted(set(paths))
+
+
+def output_paths_for(video_paths, output_dir, suffix="_mask.mp4"):
+    """Give every input its own output file in output_dir, even when base names collide."""
+    outputs = []
+    used = set()
+    for video_path in video_paths:
+        stem = os.path.splitext(os.path.basename(video_path))[0]
+        name, index = stem + suffix, 1
+        while name in used:
+            name = "{}_{}{}".format(stem, index, suffix)
+            index += 1
+        used.add(name)
+        outputs.append(os.path.join(output_dir, name))
+    return outputs
+
+
+def _init_worker(threads):
+    cv2.setNumThreads(threads)
+
+
+def process_video(job):
+    """Run the subtraction pipeline over one clip. Runs inside a worker process."""
+    video_path, output_path, scale, rois = job
+    summary = {"path": video_path, "output": output_path, "frames": 0, "seconds": 0.0, "fps": 0.0,
+               "foreground_ratio": 0.0, "error": ""}
 
-        if save_video:
-            print("Processed video saved as 'out.mp4'")
+    pipeline = SubtractionPipeline(video_path, output_path=output_path, scale=scale, rois=rois)
+    if not pipeline.cap.isOpened():
+        pipeline.cap.release()
+        summary["error"] = "could not open video"
+        return summary
+
+    report = pipeline.run()
+    for key in ("frames", "seconds", "fps", "foreground_ratio"):
+        summary[key] = report[key]
+    if pipeline.error:
+        summary["error"] = str(pipeline.error)
+    return summary
+
+
+def run_batch(video_paths, output_dir=None, workers=None, mask_format='mp4', scale=1.0, rois=None):
+    """Subtract the background of many clips, one process per clip, yielding summaries as clips finish."""
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        output_paths = output_paths_for(video_paths, output_dir, suffix="_mask." + mask_format)
+    else:
+        output_paths = [None] * len(video_paths)
+
+    jobs = [(video_path, output_path, scale, rois) for video_path, output_path in zip(video_paths, output_paths)]
+    workers = max(1, min(workers or os.cpu_count(), len(video_paths)))
+    threads = max(1, os.cpu_count() // workers)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(threads,), maxtasksperchild=1) as pool:
+        for summary in pool.imap_unordered(process_video, jobs):
+            yield summary
+
+
+def write_summaries(summaries, summary_file):
+    """Stream clip summaries to a CSV or JSONL file (chosen by extension) as they arrive."""
+    fields = ["path", "output", "frames", "seconds", "fps", "foreground_ratio", "error"]
+    with open(summary_file, 'w', newline='') as f:
+        writer = None
+        if not summary_file.lower().endswith('.jsonl'):
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+        for summary in summaries:
+            if writer:
+                writer.writerow(summary)
+            else:
+                f.write(json.dumps(summary) + "\n")
+            f.flush()
+            yield summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run MOG2 background subtraction over many videos without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="video files, directories or glob patterns")
+    parser.add_argument("-d", "--output-dir", help="save a foreground mask file per clip in this directory")
+    parser.add_argument("-f", "--format", choices=["mp4", "fgm"], default="mp4",
+                        help="mask output format: lossy mp4v video or compact bit-packed .fgm container")
+    parser.add_argument("--scale", type=float, default=1.0, help="run MOG2 on frames downscaled by this factor")
+    parser.add_argument("--roi", action="append", default=[],
+                        help="polygon region of interest as 'x,y x,y x,y' (repeatable)")
+    parser.add_argument("--compare", action="store_true",
+                        help="only time full-frame against the --scale/--roi mode on each input")
+    parser.add_argument("-s", "--summary", default="background_subtraction_summary.csv",
+                        help="summary file (.csv or .jsonl)")
+    parser.add_argument("-j", "--workers", type=int, help="number of clips processed at once (default: all cores)")
+    args = parser.parse_args(argv)
+    rois = parse_rois(';'.join(args.roi))
+
+    video_paths = find_videos(args.inputs)
+    if not video_paths:
+        print("No videos found.")
+        return 1
+
+    if args.compare:
+        for video_path in video_paths:
+            print(video_path)
+            print_comparison(compare_modes(video_path, args.scale, rois))
+        return 0
+
+    start = time.perf_counter()
+    total_frames = 0
+    summaries = run_batch(video_paths, args.output_dir, args.workers, args.format, args.scale, rois)
+    for summary in write_summaries(summaries, args.summary):
+        total_frames += summary["frames"]
+        if summary["error"]:
+            print("{}: {}".format(summary["path"], summary["error"]))
+        else:
+            print("{}: {} frames, {} fps, foreground {:.2%}".format(
+                summary["path"], summary["frames"], summary["fps"], summary["foreground_ratio"]))
+    elapsed = time.perf_counter() - start
+
+    print("Processed {} clips ({} frames) in {:.1f}s. Summary saved to {}".format(
+        len(video_paths), total_frames, elapsed, args.summary))
+    return 0
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     root = tk.Tk()
     app = BackgroundSubtractionApp(root)
     root.mainloop()
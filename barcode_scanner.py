@@ -3,13 +3,21 @@ import numpy as np
 from pyzbar.pyzbar import decode
 import tkinter as tk
 from tkinter import filedialog, messagebox
+import argparse
+import glob
+import multiprocessing
 import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
 from datetime import datetime
 
 
-def scan_barcode(frame, log_results=False, log_file="scanned_barcodes.txt"):
+def scan_barcode(frame, log_results=False, log_file="scanned_barcodes.txt", logger=None, decoder=None):
     gray_img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-    barcodes = decode(gray_img)
+    barcodes = decoder.decode(gray_img) if decoder is not None else decode(gray_img)
     scanned_data = []
     for barcode in barcodes:
         barcode_data = barcode.data.decode('utf-8')
@@ -21,38 +29,479 @@ def scan_barcode(frame, log_results=False, log_file="scanned_barcodes.txt"):
         cv2.putText(frame, '{} ({})'.format(barcode_data, barcode_type), (rect[0], rect[1]),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.9, (255, 0, 0), 2)
         scanned_data.append((barcode_data, barcode_type))
-        if log_results:
+        if logger is not None:
+            logger.log(barcode_data, barcode_type)
+        elif log_results:
             save_to_file(barcode_data, barcode_type, log_file)
     return frame, scanned_data
 
 
+def offset_barcode(barcode, dx, dy):
+    """Shift a barcode decoded from a crop back into full-frame coordinates."""
+    rect = barcode.rect
+    rect = type(rect)(rect[0] + dx, rect[1] + dy, rect[2], rect[3])
+    polygon = [type(point)(point[0] + dx, point[1] + dy) for point in barcode.polygon]
+    return barcode._replace(rect=rect, polygon=polygon)
+
+
+class RegionTrackingDecoder:
+    """Avoids decoding the full frame when the barcodes in view are already known.
+
+    A full-frame decode runs every full_scan_interval frames, and on the next frame
+    whenever a tracked region stops decoding (a miss). In between, only crops around
+    the previously found barcode polygons, widened by margin (a fraction of the
+    barcode size), are decoded. While nothing is tracked the full frame is decoded
+    every idle_scan_interval frames.
+    """
+
+    def __init__(self, full_scan_interval=15, margin=0.5, idle_scan_interval=1):
+        self.full_scan_interval = full_scan_interval
+        self.margin = margin
+        self.idle_scan_interval = idle_scan_interval
+        self.regions = []
+        self.frames_since_full_scan = 0
+        self.missed = False
+
+        self.frames = 0
+        self.full_scans = 0
+        self.region_decodes = 0
+        self.region_hits = 0
+        self.decode_time = 0.0
+        self.last_decode_time = 0.0
+
+    def decode(self, gray_img):
+        start = time.perf_counter()
+        self.frames += 1
+        self.frames_since_full_scan += 1
+
+        interval = self.full_scan_interval if self.regions else self.idle_scan_interval
+        if self.missed or self.frames_since_full_scan >= interval:
+            barcodes = decode(gray_img)
+            self.full_scans += 1
+            self.frames_since_full_scan = 0
+            self.missed = False
+        else:
+            barcodes = self._decode_regions(gray_img)
+
+        self.regions = [self._search_window(barcode, gray_img.shape) for barcode in barcodes]
+        self.last_decode_time = time.perf_counter() - start
+        self.decode_time += self.last_decode_time
+        return barcodes
+
+    def _decode_regions(self, gray_img):
+        barcodes = []
+        seen = set()
+        for x, y, w, h in self.regions:
+            self.region_decodes += 1
+            found = decode(gray_img[y:y + h, x:x + w])
+            if not found:
+                self.missed = True
+                continue
+            self.region_hits += 1
+            for barcode in found:
+                if (barcode.data, barcode.type) not in seen:
+                    seen.add((barcode.data, barcode.type))
+                    barcodes.append(offset_barcode(barcode, x, y))
+        return barcodes
+
+    def _search_window(self, barcode, shape):
+        x, y, w, h = cv2.boundingRect(np.array(barcode.polygon, np.int32))
+        pad_x, pad_y = int(w * self.margin) + 8, int(h * self.margin) + 8
+        x0, y0 = max(x - pad_x, 0), max(y - pad_y, 0)
+        x1, y1 = min(x + w + pad_x, shape[1]), min(y + h + pad_y, shape[0])
+        return x0, y0, x1 - x0, y1 - y0
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "full_scans": self.full_scans,
+            "region_decodes": self.region_decodes,
+            "region_hit_rate": self.region_hits / self.region_decodes if self.region_decodes else 0.0,
+            "avg_decode_ms": 1000 * self.decode_time / self.frames if self.frames else 0.0,
+            "last_decode_ms": 1000 * self.last_decode_time,
+        }
+
+
+def find_barcode_regions(gray_img, max_regions=8, min_area=400):
+    """Find likely barcode regions from strong one-directional gradients.
+
+    Returns rotated rectangles ((cx, cy), (w, h), angle) as given by
+    cv2.minAreaRect, largest first.
+    """
+    grad_x = cv2.Sobel(gray_img, cv2.CV_32F, 1, 0, ksize=3)
+    grad_y = cv2.Sobel(gray_img, cv2.CV_32F, 0, 1, ksize=3)
+    # Bars give a strong gradient across them and almost none along them, at any angle.
+    # In the local structure tensor that is the gap between its two eigenvalues,
+    # sqrt((Jxx - Jyy)^2 + 4 Jxy^2), which is large for bars and small for text and flat areas.
+    jxx = cv2.blur(grad_x * grad_x, (9, 9))
+    jyy = cv2.blur(grad_y * grad_y, (9, 9))
+    jxy = cv2.blur(grad_x * grad_y, (9, 9))
+    coherent = cv2.magnitude(jxx - jyy, 2 * jxy)
+    gradient = cv2.normalize(cv2.sqrt(coherent), None, 0, 255, cv2.NORM_MINMAX, cv2.CV_8U)
+    _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (15, 15))
+    binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    binary = cv2.erode(binary, None, iterations=3)
+    binary = cv2.dilate(binary, None, iterations=3)
+
+    contours, _ = cv2.findContours(binary, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contours = sorted((c for c in contours if cv2.contourArea(c) >= min_area), key=cv2.contourArea, reverse=True)
+    return [cv2.minAreaRect(c) for c in contours[:max_regions]]
+
+
+class RegionDetectionDecoder:
+    """Decodes only likely barcode regions, at several scales and rotations.
+
+    Each region found by find_barcode_regions is cropped with a margin, then
+    decoded upright and straightened to the region's angle, at every scale in
+    scales, until a code is found. Regions are tried largest first and no new
+    attempt starts once budget_ms has been spent on the frame.
+    """
+
+    def __init__(self, scales=(1.0, 2.0), budget_ms=40.0, max_regions=8, margin=0.2):
+        self.scales = scales
+        self.budget_ms = budget_ms
+        self.max_regions = max_regions
+        self.margin = margin
+
+        self.frames = 0
+        self.regions_found = 0
+        self.decode_attempts = 0
+        self.over_budget = 0
+        self.decode_time = 0.0
+        self.last_decode_time = 0.0
+
+    def decode(self, gray_img):
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000
+        self.frames += 1
+
+        regions = find_barcode_regions(gray_img, self.max_regions)
+        self.regions_found += len(regions)
+        barcodes = []
+        seen = set()
+        for region in regions:
+            for barcode in self._decode_region(gray_img, region, deadline):
+                if (barcode.data, barcode.type) not in seen:
+                    seen.add((barcode.data, barcode.type))
+                    barcodes.append(barcode)
+            if time.perf_counter() > deadline:
+                self.over_budget += 1
+                break
+
+        self.last_decode_time = time.perf_counter() - start
+        self.decode_time += self.last_decode_time
+        return barcodes
+
+    def _decode_region(self, gray_img, region, deadline):
+        (cx, cy), (w, h), angle = region
+        half = max(w, h) * (0.5 + self.margin) + 4
+        x0, y0 = int(max(cx - half, 0)), int(max(cy - half, 0))
+        x1, y1 = int(min(cx + half, gray_img.shape[1])), int(min(cy + half, gray_img.shape[0]))
+        crop = gray_img[y0:y1, x0:x1]
+
+        # zbar scans along rows and columns, so also try the crop with the region straightened
+        angles = [0.0]
+        if min(angle % 90, 90 - angle % 90) > 5:
+            angles.append(angle)
+
+        for rotation in angles:
+            rotate = cv2.getRotationMatrix2D((crop.shape[1] / 2, crop.shape[0] / 2), rotation, 1.0)
+            rotated = crop if rotation == 0 else cv2.warpAffine(crop, rotate, (crop.shape[1], crop.shape[0]),
+                                                                  flags=cv2.INTER_LINEAR,
+                                                                  borderMode=cv2.BORDER_REPLICATE)
+            unrotate = cv2.invertAffineTransform(rotate)
+            for scale in self.scales:
+                if time.perf_counter() > deadline:
+                    return []
+                scaled = rotated if scale == 1 else cv2.resize(rotated, None, fx=scale, fy=scale,
+                                                               interpolation=cv2.INTER_CUBIC)
+                self.decode_attempts += 1
+                found = decode(scaled)
+                if found:
+                    return [self._to_frame(barcode, scale, unrotate, x0, y0) for barcode in found]
+        return []
+
+    @staticmethod
+    def _to_frame(barcode, scale, unrotate, x0, y0):
+        """Map a barcode decoded from a scaled, rotated crop back to frame coordinates."""
+        points = np.array(barcode.polygon, np.float64).reshape(-1, 1, 2) / scale
+        points = cv2.transform(points, unrotate).reshape(-1, 2) + (x0, y0)
+        point_type = type(barcode.polygon[0])
+        polygon = [point_type(int(round(x)), int(round(y))) for x, y in points]
+        x, y, w, h = cv2.boundingRect(np.array(polygon, np.int32))
+        return barcode._replace(rect=type(barcode.rect)(x, y, w, h), polygon=polygon)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "regions_per_frame": self.regions_found / self.frames if self.frames else 0.0,
+            "decode_attempts": self.decode_attempts,
+            "frames_over_budget": self.over_budget,
+            "avg_decode_ms": 1000 * self.decode_time / self.frames if self.frames else 0.0,
+            "last_decode_ms": 1000 * self.last_decode_time,
+        }
+
+
+EAN13_L_CODES = ['0001101', '0011001', '0010011', '0111101', '0100011',
+                  '0110001', '0101111', '0111011', '0110111', '0001011']
+EAN13_PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG',
+                'LGGLLG', 'LGGGLL', 'LGLGLL', 'LGLLLG', 'LGGLGL']
+
+
+def ean13_modules(digits):
+    """The 95 bar modules ('1' = black) of an EAN-13 code for 12 digits; the check digit is added."""
+    values = [int(d) for d in digits]
+    check = (10 - sum(v * (3 if i % 2 else 1) for i, v in enumerate(values)) % 10) % 10
+    values.append(check)
+    modules = '101'
+    for value, parity in zip(values[1:7], EAN13_PARITY[values[0]]):
+        code = EAN13_L_CODES[value]
+        if parity == 'G':
+            code = ''.join('1' if c == '0' else '0' for c in code)[::-1]
+        modules += code
+    modules += '01010'
+    for value in values[7:]:
+        modules += ''.join('1' if c == '0' else '0' for c in EAN13_L_CODES[value])
+    return modules + '101'
+
+
+def make_synthetic_barcode(angle, scale=1.0, digits='590123412345', size=(640, 480), module=3):
+    """Render an EAN-13 code rotated by angle degrees on a cluttered page, then resize by scale.
+
+    Returns (gray_img, corners) where corners are the four corners of the bars.
+    """
+    width, height = size
+    page = np.full((height, width), 235, np.uint8)
+    rng = np.random.RandomState(int(angle * 10))
+    for _ in range(12):
+        # Text-like clutter, with edges in every direction
+        x, y = int(rng.randint(0, width - 120)), int(rng.randint(10, height - 10))
+        cv2.putText(page, "Lorem ipsum 42", (x, y), cv2.FONT_HERSHEY_SIMPLEX, 0.5, 60, 1)
+
+    modules = ean13_modules(digits)
+    bar_w, bar_h = len(modules) * module, 150
+    x0, y0 = (width - bar_w) // 2, (height - bar_h) // 2
+    page[y0 - 20:y0 + bar_h + 20, x0 - 11 * module:x0 + bar_w + 11 * module] = 255
+    for i, m in enumerate(modules):
+        if m == '1':
+            page[y0:y0 + bar_h, x0 + i * module:x0 + (i + 1) * module] = 0
+
+    rotation = cv2.getRotationMatrix2D((width / 2.0, height / 2.0), angle, scale)
+    out_size = (int(round(width * scale)), int(round(height * scale)))
+    rotation[:, 2] += (np.array(out_size) - np.array(size)) / 2.0
+    gray_img = cv2.warpAffine(page, rotation, out_size, flags=cv2.INTER_AREA, borderValue=235)
+    corners = np.array([[x0, y0], [x0 + bar_w, y0], [x0 + bar_w, y0 + bar_h], [x0, y0 + bar_h]], np.float64)
+    corners = np.hstack([corners, np.ones((4, 1))]) @ rotation.T
+    return gray_img, corners.astype(np.float32)
+
+
+def region_recall(angles=(0, 10, 20, 30, 45, 60, 75, 90), scales=(0.45, 1.0)):
+    """Check find_barcode_regions on synthetic rotated codes, without decoding.
+
+    A code counts as found when a region's centre lies inside it and the region
+    covers at least half of it. Returns {(angle, scale): found}.
+    """
+    results = {}
+    for scale in scales:
+        for angle in angles:
+            gray_img, corners = make_synthetic_barcode(angle, scale)
+            code_area = cv2.contourArea(corners)
+            found = False
+            for region in find_barcode_regions(gray_img):
+                (cx, cy), (w, h), _ = region
+                inside = cv2.pointPolygonTest(corners, (float(cx), float(cy)), False) >= 0
+                overlap, _ = cv2.intersectConvexConvex(corners, cv2.boxPoints(region))
+                if inside and overlap >= 0.5 * code_area:
+                    found = True
+                    break
+            results[(angle, scale)] = found
+    return results
+
+
+def compare_decoders(image_paths, decoder):
+    """Compare full-frame pyzbar decoding with decoder over a set of images.
+
+    Recall is measured against the union of codes either method found per image.
+    """
+    totals = {"full": [0.0, 0], "detect": [0.0, 0]}
+    union_codes = 0
+    images = 0
+    for path in image_paths:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        images += 1
+        gray_img = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        found = {}
+        for name, decode_frame in (("full", decode), ("detect", decoder.decode)):
+            start = time.perf_counter()
+            found[name] = {(barcode.data, barcode.type) for barcode in decode_frame(gray_img)}
+            totals[name][0] += time.perf_counter() - start
+        union = found["full"] | found["detect"]
+        union_codes += len(union)
+        for name in totals:
+            totals[name][1] += len(found[name])
+
+    report = {"images": images, "codes": union_codes}
+    for name, (seconds, codes) in totals.items():
+        report[name] = {
+            "images_per_second": images / seconds if seconds else 0.0,
+            "codes": codes,
+            "recall": codes / union_codes if union_codes else 0.0,
+        }
+    return report
+
+
 def save_to_file(data, barcode_type, file_path):
     with open(file_path, 'a') as f:
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         f.write("{}, {}, {}\n".format(timestamp, data, barcode_type))
 
 
+class ScanLogger:
+    """Appends scanned barcodes to a log file from a background thread.
+
+    Scans are queued in memory and written in batches, so the camera loop never
+    waits on the disk. A (data, type) pair seen again within dedupe_window seconds
+    of when it was last logged is dropped, so a code held in view is logged again
+    every dedupe_window seconds. A failed write keeps its lines and is retried on
+    the next flush; the failure is available as error meanwhile. close() writes
+    everything still queued and raises the last error if any lines could not be
+    written.
+    """
+
+    def __init__(self, file_path, dedupe_window=2.0, flush_interval=0.5, max_batch=256):
+        self.file_path = file_path
+        self.dedupe_window = dedupe_window
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.last_seen = {}
+        self.logged = 0
+        self.dropped = 0
+        self.error = None
+        self.unwritten = 0
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def log(self, data, barcode_type):
+        """Queue a scan unless the same code was logged within the dedupe window."""
+        now = time.monotonic()
+        key = (data, barcode_type)
+        last = self.last_seen.get(key)
+        if last is not None and now - last < self.dedupe_window:
+            self.dropped += 1
+            return False
+        if len(self.last_seen) > 10000:
+            self.last_seen = {k: t for k, t in self.last_seen.items() if now - t < self.dedupe_window}
+        # The window runs from the last logged sighting, not the last sighting of any kind
+        self.last_seen[key] = now
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.queue.put("{}, {}, {}\n".format(timestamp, data, barcode_type))
+        self.logged += 1
+        return True
+
+    def close(self):
+        self.queue.put(None)
+        self.thread.join()
+        if self.unwritten:
+            raise IOError("{} scans could not be written to {}: {}".format(
+                self.unwritten, self.file_path, self.error))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        done = False
+        lines = []
+        while not done:
+            try:
+                # Wait for the first line, then collect whatever else arrives before the next flush
+                line = self.queue.get(timeout=self.flush_interval)
+                deadline = time.monotonic() + self.flush_interval
+                while line is not None:
+                    lines.append(line)
+                    if len(lines) >= self.max_batch:
+                        break
+                    line = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                done = line is None
+            except queue.Empty:
+                pass
+            if lines:
+                try:
+                    with open(self.file_path, 'a') as f:
+                        f.writelines(lines)
+                except OSError as e:
+                    # Keep the lines for the next flush instead of losing them with the thread
+                    self.error = e
+                    self.unwritten = len(lines)
+                    continue
+                lines = []
+                self.error = None
+                self.unwritten = 0
+
+
+def make_decoder(live):
+    """Build the decoder chosen in the window's options, or None for plain full-frame decoding."""
+    if detect_var.get():
+        return RegionDetectionDecoder()
+    if live and track_var.get():
+        return RegionTrackingDecoder()
+    return None
+
+
 def start_scanner():
     cap = cv2.VideoCapture(2)
     log_file = "scanned_barcodes.txt"
+    decoder = make_decoder(live=True)
+    log_error = None
+    try:
+        with ScanLogger(log_file) as logger:
+            scan_loop(cap, logger, decoder)
+    except IOError as e:
+        log_error = e
+    cap.release()
+    cv2.destroyAllWindows()
+    if decoder is not None:
+        print("Decoder stats: {}".format(decoder.stats()))
+    if log_error is not None:
+        messagebox.showerror("Scan Log Error", str(log_error))
+        return
+    messagebox.showinfo("Scanner Closed", "Scanned data saved to {}".format(log_file))
+
+
+def scan_loop(cap, logger, decoder):
+    """Show decoded webcam frames until 'q' is pressed or the camera stops."""
     while True:
         ret, frame = cap.read()
         if not ret:
             break
-        scanned_frame, scanned_data = scan_barcode(frame, log_results=True, log_file=log_file)
+        scanned_frame, scanned_data = scan_barcode(frame, logger=logger, decoder=decoder)
+        if decoder is not None:
+            stats = decoder.stats()
+            cv2.putText(scanned_frame, 'decode {:.1f} ms'.format(stats["last_decode_ms"]), (10, 25),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            if "region_hit_rate" in stats:
+                cv2.putText(scanned_frame, 'region hit rate {:.0%}'.format(stats["region_hit_rate"]), (10, 50),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        if logger.error is not None:
+            cv2.putText(scanned_frame, 'log not written: {} scans pending'.format(logger.unwritten),
+                        (10, scanned_frame.shape[0] - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
         cv2.imshow('Barcode Scanner', scanned_frame)
         if cv2.waitKey(1) & 0xFF == ord('q'):
             break
-    cap.release()
-    cv2.destroyAllWindows()
-    messagebox.showinfo("Scanner Closed", "Scanned data saved to {}".format(log_file))
 
 
 def select_file():
     file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png *.jpg *.jpeg")])
     if file_path:
         image = cv2.imread(file_path)
-        scanned_image, scanned_data = scan_barcode(image)
+        scanned_image, scanned_data = scan_barcode(image, decoder=make_decoder(live=False))
         cv2.imshow('Barcode Scanner', scanned_image)
         if scanned_data:
             save_option = messagebox.askyesno("Save Results", "Do you want to save the scanned results?")
@@ -85,21 +534,196 @@ def view_log_file():
     log_text.pack(padx=10, pady=10)
 
 
-app = tk.Tk()
-app.title("Barcode Scanner")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+
+
+def find_images(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [os.path.join(root, name) for root, _, names in os.walk(item) for name in names]
+        else:
+            matches = glob.glob(item)
+        paths.extend(os.path.abspath(path) for path in matches
+                     if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(set(paths))
+
+
+class BarcodeIndex:
+    """SQLite index of scanned images and the barcodes found in them.
+
+    Images are keyed by path and modification time, so a rescan can skip every
+    file that has not changed since it was last scanned.
+    """
+
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS images (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                scanned_at TEXT NOT NULL,
+                error TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS barcodes (
+                path TEXT NOT NULL,
+                data TEXT NOT NULL,
+                type TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS barcodes_data ON barcodes(data);
+            CREATE INDEX IF NOT EXISTS barcodes_path ON barcodes(path);
+        """)
+
+    def scanned_mtimes(self):
+        return dict(self.conn.execute("SELECT path, mtime_ns FROM images"))
+
+    def store(self, path, mtime_ns, scanned_data, error=""):
+        self.conn.execute("DELETE FROM barcodes WHERE path = ?", (path,))
+        self.conn.execute("INSERT OR REPLACE INTO images (path, mtime_ns, scanned_at, error) VALUES (?, ?, ?, ?)",
+                          (path, mtime_ns, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), error))
+        self.conn.executemany("INSERT INTO barcodes (path, data, type) VALUES (?, ?, ?)",
+                              [(path, data, barcode_type) for data, barcode_type in scanned_data])
+
+    def commit(self):
+        self.conn.commit()
+
+    def find(self, data):
+        """Return the paths of all indexed images that contain the given barcode value."""
+        rows = self.conn.execute("SELECT DISTINCT path FROM barcodes WHERE data = ? ORDER BY path", (data,))
+        return [path for path, in rows]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+def _init_worker():
+    cv2.setNumThreads(1)
+
+
+def scan_image_file(job):
+    """Scan one image file for barcodes. Runs inside a worker process."""
+    path, mtime_ns = job
+    image = cv2.imread(path)
+    if image is None:
+        return path, mtime_ns, [], "could not read image"
+    _, scanned_data = scan_barcode(image)
+    return path, mtime_ns, scanned_data, ""
+
+
+def bulk_scan(inputs, db_path, workers=None, commit_every=500):
+    """Scan every new or modified image under inputs into the index. Returns (scanned, skipped)."""
+    index = BarcodeIndex(db_path)
+    try:
+        known = index.scanned_mtimes()
+        jobs = []
+        skipped = 0
+        for path in find_images(inputs):
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            if known.get(path) == mtime_ns:
+                skipped += 1
+            else:
+                jobs.append((path, mtime_ns))
+        if not jobs:
+            return 0, skipped
+
+        workers = workers or os.cpu_count()
+        chunksize = max(1, min(64, len(jobs) // (workers * 4)))
+        with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+            # Commit in batches so an interrupted scan resumes where it stopped
+            for done, result in enumerate(pool.imap_unordered(scan_image_file, jobs, chunksize=chunksize), start=1):
+                index.store(*result)
+                if done % commit_every == 0:
+                    index.commit()
+                    print("Scanned {}/{} images".format(done, len(jobs)))
+        return len(jobs), skipped
+    finally:
+        index.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk barcode scanning into a searchable SQLite index.")
+    parser.add_argument("--db", default="barcode_index.sqlite", help="index database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="scan new or modified images into the index")
+    scan_parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    scan_parser.add_argument("-j", "--workers", type=int, help="number of worker processes (default: all cores)")
+
+    find_parser = subparsers.add_parser("find", help="list the images that contain a barcode value")
+    find_parser.add_argument("data", help="barcode value to look up")
+
+    compare_parser = subparsers.add_parser("compare", help="compare full-frame decoding with region detection")
+    compare_parser.add_argument("inputs", nargs="*", help="image files, directories or glob patterns")
+    compare_parser.add_argument("--synthetic", metavar="DIR",
+                                help="also write rotated synthetic EAN-13 images (including 45 degrees) to DIR, "
+                                     "compare on them and check region detection on each")
+    compare_parser.add_argument("--scales", type=float, nargs="+", default=[1.0, 2.0], help="crop scales to try")
+    compare_parser.add_argument("--budget-ms", type=float, default=40.0, help="detection time budget per image")
+    args = parser.parse_args(argv)
+
+    if args.command == "scan":
+        start = time.perf_counter()
+        scanned, skipped = bulk_scan(args.inputs, args.db, args.workers)
+        elapsed = time.perf_counter() - start
+        print("Scanned {} images in {:.1f}s, skipped {} unchanged. Index saved to {}".format(
+            scanned, elapsed, skipped, args.db))
+    elif args.command == "compare":
+        inputs = list(args.inputs)
+        if args.synthetic:
+            os.makedirs(args.synthetic, exist_ok=True)
+            for (angle, scale), found in sorted(region_recall().items(), key=lambda item: (item[0][1], item[0][0])):
+                print("synthetic {:>2} deg at {:.2f}x: region {}".format(angle, scale, "found" if found else "MISSED"))
+                path = os.path.join(args.synthetic, "ean13_{:02d}deg_{:.2f}x.png".format(angle, scale))
+                cv2.imwrite(path, make_synthetic_barcode(angle, scale)[0])
+                inputs.append(path)
+        if not inputs:
+            parser.error("compare needs images or --synthetic")
+        decoder = RegionDetectionDecoder(scales=tuple(args.scales), budget_ms=args.budget_ms)
+        report = compare_decoders(find_images(inputs), decoder)
+        print("{} images, {} distinct codes".format(report["images"], report["codes"]))
+        for name in ("full", "detect"):
+            print("{:<7} {:>8.1f} images/s, {} codes, recall {:.0%}".format(
+                name, report[name]["images_per_second"], report[name]["codes"], report[name]["recall"]))
+    else:
+        index = BarcodeIndex(args.db)
+        for path in index.find(args.data):
+            print(path)
+        index.close()
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    app = tk.Tk()
+    app.title("Barcode Scanner")
+
+    # Buttons
+    start_button = tk.Button(app, text="Start Webcam Scanner", command=start_scanner)
+    start_button.pack(pady=10)
+
+    track_var = tk.BooleanVar(value=True)
+    track_checkbox = tk.Checkbutton(app, text="Track Barcode Regions", variable=track_var)
+    track_checkbox.pack()
 
-# Buttons
-start_button = tk.Button(app, text="Start Webcam Scanner", command=start_scanner)
-start_button.pack(pady=10)
+    detect_var = tk.BooleanVar(value=False)
+    detect_checkbox = tk.Checkbutton(app, text="Detect Small/Rotated Codes", variable=detect_var)
+    detect_checkbox.pack()
 
-open_file_button = tk.Button(app, text="Select Image File", command=select_file)
-open_file_button.pack(pady=10)
+    open_file_button = tk.Button(app, text="Select Image File", command=select_file)
+    open_file_button.pack(pady=10)
 
-view_log_button = tk.Button(app, text="View Scan Logs", command=view_log_file)
-view_log_button.pack(pady=10)
+    view_log_button = tk.Button(app, text="View Scan Logs", command=view_log_file)
+    view_log_button.pack(pady=10)
 
-# Footer
-footer_label = tk.Label(app, text="Press 'q' to exit the webcam scanner.", fg="blue")
-footer_label.pack(pady=5)
+    # Footer
+    footer_label = tk.Label(app, text="Press 'q' to exit the webcam scanner.", fg="blue")
+    footer_label.pack(pady=5)
 
-app.mainloop()
+    app.mainloop()
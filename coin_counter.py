@@ -1,3 +1,13 @@
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import OrderedDict
+
 import cv2
 import numpy as np
 import tkinter as tk
@@ -5,50 +15,201 @@ from tkinter import filedialog, messagebox
 from tkinter import Label, Scale, Button, HORIZONTAL
 
 
-def process_image(image, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value):
-    """Process the image for coin detection."""
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-
+def point_set_areas(labels, num_labels):
+    """Polygon area of every label's pixel list, as cv2.contourArea sees it.
+
+    Equivalent to calling cv2.contourArea on np.where(labels == i) for each
+    label, but computed for all labels in a single pass over the image.
+    """
+    flat = labels.ravel()
+    indices = np.flatnonzero(flat)
+    indices = indices[np.argsort(flat[indices], kind='stable')]
+    point_labels = flat[indices]
+    xs, ys = np.divmod(indices, labels.shape[1])
+
+    # Shoelace terms between consecutive points, wrapping last -> first per label
+    starts = np.flatnonzero(np.r_[True, point_labels[1:] != point_labels[:-1]])
+    next_points = np.arange(1, len(indices) + 1)
+    next_points[np.r_[starts[1:], len(indices)] - 1] = starts
+    cross = xs * ys[next_points] - xs[next_points] * ys
+
+    areas = np.zeros(num_labels)
+    areas[point_labels[starts]] = np.abs(np.add.reduceat(cross, starts)) * 0.5
+    return areas
+
+
+def component_stats(binary_image):
+    """Label a binary image once and return statistics for every component."""
+    num_labels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary_image)
+    areas = stats[:, cv2.CC_STAT_AREA]
+    return {
+        "num_labels": num_labels,
+        "labels": labels,
+        "areas": areas,
+        "contour_areas": point_set_areas(labels, num_labels) if num_labels > 1 else np.zeros(num_labels),
+        "centroids": centroids,
+        "bboxes": stats[:, :4],
+        "radii": np.sqrt(areas / np.pi),
+    }
+
+
+def blur_stage(gray, blur_kernel_size):
     # Apply Gaussian blur
-    blurred = cv2.GaussianBlur(gray, (blur_kernel_size, blur_kernel_size), 0)
+    return cv2.GaussianBlur(gray, (blur_kernel_size, blur_kernel_size), 0)
+
 
+def threshold_stage(blurred, threshold_value):
     # Thresholding
     _, binary_image = cv2.threshold(blurred, threshold_value, 255, cv2.THRESH_BINARY)
+    return binary_image
 
+
+def erode_stage(binary_image, erosion_iterations):
     # Erosion
     kernel = np.ones((5, 5), np.uint8)
     eroded_image = cv2.erode(binary_image, kernel, iterations=erosion_iterations)
 
     # Further blur after erosion
-    eroded_image = cv2.GaussianBlur(eroded_image, (9, 9), 0)
+    return cv2.GaussianBlur(eroded_image, (9, 9), 0)
+
 
+def final_threshold_stage(eroded_image, final_threshold_value):
     # Final thresholding
     _, eroded_image = cv2.threshold(eroded_image, final_threshold_value, 255, cv2.THRESH_BINARY)
+    return eroded_image
 
-    # Connected components for coin detection
-    num_labels, labels = cv2.connectedComponents(eroded_image)
 
-    # Filter small components
-    coin_labels = [i for i in range(1, num_labels) if cv2.contourArea(np.array(np.where(labels == i)).T) > 10]
+def threshold_coins(image, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value):
+    """Turn the image into a binary mask where every coin is one blob."""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = blur_stage(gray, blur_kernel_size)
+    binary_image = threshold_stage(blurred, threshold_value)
+    eroded_image = erode_stage(binary_image, erosion_iterations)
+    return final_threshold_stage(eroded_image, final_threshold_value)
+
+
+class StageCache:
+    """Bounded LRU cache for the intermediate images of the coin counting chain.
+
+    Every stage is keyed by the file path plus the parameters of all the stages
+    up to and including it, so moving a late slider reuses the earlier stages.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+
+        self.misses += 1
+        value = compute()
+        if value is None:
+            return value
+        self.entries[key] = value
+        self.size += value.nbytes
+        # Never evict the entry we just added, even if it alone exceeds the budget
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+        return value
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def process(self, file_path, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value):
+        """Cached equivalent of process_image(cv2.imread(file_path), ...)."""
+        key = (file_path,)
+        image = self.get(key + ("image",), lambda: cv2.imread(file_path))
+        if image is None:
+            return None, 0
+
+        gray = self.get(key + ("gray",), lambda: cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+        key += (blur_kernel_size,)
+        blurred = self.get(key + ("blur",), lambda: blur_stage(gray, blur_kernel_size))
+        key += (threshold_value,)
+        binary_image = self.get(key + ("threshold",), lambda: threshold_stage(blurred, threshold_value))
+        key += (erosion_iterations,)
+        eroded_image = self.get(key + ("erode",), lambda: erode_stage(binary_image, erosion_iterations))
+        key += (final_threshold_value,)
+        final_image = self.get(key + ("final",),
+                               lambda: final_threshold_stage(eroded_image, final_threshold_value))
+
+        coins = count_coins(final_image)
+        return draw_coins(image, coins), len(coins["labels"])
+
+
+def count_coins(binary_image):
+    """Return the statistics of the components that are large enough to be coins."""
+    stats = component_stats(binary_image)
+
+    # Filter small components (label 0 is the background)
+    coin_labels = np.flatnonzero(stats["contour_areas"] > 10)
+    coin_labels = coin_labels[coin_labels > 0]
+
+    return {
+        "labels": coin_labels,
+        "areas": stats["areas"][coin_labels],
+        "centroids": stats["centroids"][coin_labels],
+        "bboxes": stats["bboxes"][coin_labels],
+        "radii": stats["radii"][coin_labels],
+    }
+
+
+def draw_coins(image, coins):
+    """Draw one marker per detected coin."""
+    output_image = image.copy()
+    for (x, y), radius in zip(coins["centroids"], coins["radii"]):
+        cv2.circle(output_image, (int(round(x)), int(round(y))), int(round(radius)) + 5, (0, 255, 0), -1)
+    return output_image
+
+
+def process_image(image, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value):
+    """Process the image for coin detection."""
+    binary_image = threshold_coins(image, blur_kernel_size, threshold_value, erosion_iterations,
+                                   final_threshold_value)
+
+    # Connected components for coin detection
+    coins = count_coins(binary_image)
 
     # Draw detected coins
-    output_image = image.copy()
-    for label in coin_labels:
-        coords = np.column_stack(np.where(labels == label))
-        for coord in coords:
-            cv2.circle(output_image, tuple(coord[::-1]), 5, (0, 255, 0), -1)
+    output_image = draw_coins(image, coins)
 
-    coin_count = len(coin_labels)
+    coin_count = len(coins["labels"])
     return output_image, coin_count
 
 
+stage_cache = StageCache()
+selected_file = None
+pending_preview = None
+
+
 def select_image():
     """Open file dialog to select image and process it."""
+    global selected_file
     file_path = filedialog.askopenfilename()
     if not file_path:
         messagebox.showerror("Error", "Please select an image file.")
         return
 
+    selected_file = file_path
+    update_preview()
+
+
+def update_preview():
+    """Process the selected image with the current slider values and show the result."""
+    global processed_image, pending_preview
+    pending_preview = None
+    if selected_file is None:
+        return
+
     # Get values from sliders
     blur_kernel_size = blur_slider.get()
     threshold_value = threshold_slider.get()
@@ -59,16 +220,28 @@ def select_image():
     if blur_kernel_size % 2 == 0:
         blur_kernel_size += 1
 
-    # Process image
-    global processed_image
-    processed_image, coin_count = process_image(
-        cv2.imread(file_path), blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value
+    # Process image, reusing every stage whose parameters did not change
+    output_image, coin_count = stage_cache.process(
+        selected_file, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value
     )
-    if processed_image is not None:
-        cv2.imshow("Coin Counter", processed_image)
-        cv2.waitKey(0)  # press a key to close the window !
-        cv2.destroyAllWindows()
-        messagebox.showinfo("Coin Count", "Number of coins detected: {}".format(coin_count))
+    if output_image is None:
+        messagebox.showerror("Error", "Could not read image {}".format(selected_file))
+        return
+
+    processed_image = output_image
+    cv2.imshow("Coin Counter", processed_image)
+    cv2.waitKey(1)
+    count_label.config(text="Number of coins detected: {}".format(coin_count))
+
+
+def schedule_preview(_value=None):
+    """Slider callback: coalesce a burst of slider moves into one preview update."""
+    global pending_preview
+    if selected_file is None:
+        return
+    if pending_preview is not None:
+        app.after_cancel(pending_preview)
+    pending_preview = app.after(30, update_preview)
 
 
 def save_results():
@@ -86,46 +259,162 @@ def save_results():
         messagebox.showinfo("Saved", "Image saved successfully!")
 
 
-# Initialize main app window
-app = tk.Tk()
-app.title("Coin Counter")
-app.geometry("300x450")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
 
-# Labels and sliders
-label_blur = Label(app, text="Blur Kernel Size (odd number):")
-label_blur.pack(pady=5)
 
-blur_slider = Scale(app, from_=3, to=31, resolution=2, orient=HORIZONTAL)
-blur_slider.set(5)
-blur_slider.pack(pady=5)
+def find_images(inputs):
+    """Expand directories and glob patterns into a sorted list of image paths."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = [os.path.join(item, name) for name in os.listdir(item)]
+        else:
+            matches = glob.glob(item)
+        paths.extend(path for path in matches
+                     if os.path.isfile(path) and path.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(set(paths))
 
-label_threshold = Label(app, text="Threshold Value:")
-label_threshold.pack(pady=5)
 
-threshold_slider = Scale(app, from_=1, to=255, orient=HORIZONTAL)
-threshold_slider.set(50)
-threshold_slider.pack(pady=5)
+def _init_worker():
+    # Each worker handles one image at a time; OpenCV's own thread pool would oversubscribe the cores.
+    cv2.setNumThreads(1)
 
-label_erosion = Label(app, text="Erosion Iterations:")
-label_erosion.pack(pady=5)
 
-erosion_slider = Scale(app, from_=1, to=10, orient=HORIZONTAL)
-erosion_slider.set(5)
-erosion_slider.pack(pady=5)
+def count_coins_in_file(job):
+    """Count the coins in one image file. Runs inside a worker process."""
+    file_path, params, output_dir = job
+    start = time.perf_counter()
+    result = {"path": file_path, "coins": None, "width": None, "height": None, "seconds": None, "error": ""}
 
-label_final_threshold = Label(app, text="Final Threshold Value:")
-label_final_threshold.pack(pady=5)
+    image = cv2.imread(file_path)
+    if image is None:
+        result["error"] = "could not read image"
+        return result
 
-final_threshold_slider = Scale(app, from_=1, to=255, orient=HORIZONTAL)
-final_threshold_slider.set(225)
-final_threshold_slider.pack(pady=5)
+    output_image, coin_count = process_image(image, *params)
+    if output_dir:
+        cv2.imwrite(os.path.join(output_dir, os.path.basename(file_path)), output_image)
 
-# Buttons
-btn_select_image = Button(app, text="Select Image", command=select_image)
-btn_select_image.pack(pady=10)
+    result.update(coins=coin_count, width=image.shape[1], height=image.shape[0],
+                  seconds=round(time.perf_counter() - start, 4))
+    return result
 
-btn_save_results = Button(app, text="Save Results", command=save_results)
-btn_save_results.pack(pady=10)
 
-# Run the app
-app.mainloop()
+def run_batch(file_paths, blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value,
+              output_dir=None, workers=None):
+    """Count coins in many images over a process pool, yielding results as each image finishes."""
+    # Ensure blur kernel size is odd
+    if blur_kernel_size % 2 == 0:
+        blur_kernel_size += 1
+    params = (blur_kernel_size, threshold_value, erosion_iterations, final_threshold_value)
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    jobs = [(file_path, params, output_dir) for file_path in file_paths]
+    workers = workers or os.cpu_count()
+    chunksize = max(1, min(16, len(jobs) // (workers * 4)))
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(count_coins_in_file, jobs, chunksize=chunksize):
+            yield result
+
+
+def write_results(results, results_file):
+    """Stream results to a CSV or JSONL file (chosen by extension), flushing after every image."""
+    fields = ["path", "coins", "width", "height", "seconds", "error"]
+    with open(results_file, 'w', newline='') as f:
+        writer = None
+        if not results_file.lower().endswith('.jsonl'):
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+        for result in results:
+            if writer:
+                writer.writerow(result)
+            else:
+                f.write(json.dumps(result) + "\n")
+            f.flush()
+            yield result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count coins in a batch of images without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("--blur", type=int, default=5, help="blur kernel size (odd number)")
+    parser.add_argument("--threshold", type=int, default=50, help="threshold value")
+    parser.add_argument("--erosion", type=int, default=5, help="erosion iterations")
+    parser.add_argument("--final-threshold", type=int, default=225, help="final threshold value")
+    parser.add_argument("-o", "--output", default="coin_counts.csv", help="results file (.csv or .jsonl)")
+    parser.add_argument("--annotated-dir", help="also save annotated images to this directory")
+    parser.add_argument("-j", "--workers", type=int, help="number of worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    file_paths = find_images(args.inputs)
+    if not file_paths:
+        print("No images found.")
+        return 1
+
+    start = time.perf_counter()
+    results = run_batch(file_paths, args.blur, args.threshold, args.erosion, args.final_threshold,
+                        output_dir=args.annotated_dir, workers=args.workers)
+    failed = 0
+    for result in write_results(results, args.output):
+        if result["error"]:
+            failed += 1
+            print("{}: {}".format(result["path"], result["error"]))
+    elapsed = time.perf_counter() - start
+
+    print("Processed {} images in {:.1f}s ({:.0f} images/hour), {} failed. Results saved to {}".format(
+        len(file_paths), elapsed, len(file_paths) / elapsed * 3600, failed, args.output))
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    # Initialize main app window
+    app = tk.Tk()
+    app.title("Coin Counter")
+    app.geometry("300x480")
+
+    # Labels and sliders
+    label_blur = Label(app, text="Blur Kernel Size (odd number):")
+    label_blur.pack(pady=5)
+
+    blur_slider = Scale(app, from_=3, to=31, resolution=2, orient=HORIZONTAL, command=schedule_preview)
+    blur_slider.set(5)
+    blur_slider.pack(pady=5)
+
+    label_threshold = Label(app, text="Threshold Value:")
+    label_threshold.pack(pady=5)
+
+    threshold_slider = Scale(app, from_=1, to=255, orient=HORIZONTAL, command=schedule_preview)
+    threshold_slider.set(50)
+    threshold_slider.pack(pady=5)
+
+    label_erosion = Label(app, text="Erosion Iterations:")
+    label_erosion.pack(pady=5)
+
+    erosion_slider = Scale(app, from_=1, to=10, orient=HORIZONTAL, command=schedule_preview)
+    erosion_slider.set(5)
+    erosion_slider.pack(pady=5)
+
+    label_final_threshold = Label(app, text="Final Threshold Value:")
+    label_final_threshold.pack(pady=5)
+
+    final_threshold_slider = Scale(app, from_=1, to=255, orient=HORIZONTAL, command=schedule_preview)
+    final_threshold_slider.set(225)
+    final_threshold_slider.pack(pady=5)
+
+    # Buttons
+    btn_select_image = Button(app, text="Select Image", command=select_image)
+    btn_select_image.pack(pady=10)
+
+    btn_save_results = Button(app, text="Save Results", command=save_results)
+    btn_save_results.pack(pady=10)
+
+    count_label = Label(app, text="Select an image to start.")
+    count_label.pack(pady=5)
+
+    # Run the app
+    app.mainloop()
@@ -1,3 +1,10 @@
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
 import cv2
 import numpy as np
 import tkinter as tk
@@ -6,7 +13,19 @@ from tkinter import messagebox
 from PIL import Image, ImageTk
 
 
-def rotate_document(image):
+def content_mask(image, max_side=None):
+	"""Return a binary mask of the page content (255) on a copy shrunk to max_side.
+
+	Measuring the angle on a copy whose longest side is at most max_side pixels is
+	much faster and lighter on large scans and gives the same angle within a
+	fraction of a degree.
+	"""
+	# Shrink the page for estimation; INTER_AREA keeps thin strokes visible as grey
+	(h, w) = image.shape[:2]
+	if max_side and max(h, w) > max_side:
+		factor = max_side / float(max(h, w))
+		image = cv2.resize(image, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA)
+
 	# Convert the image to grayscale
 	gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
 
@@ -14,25 +33,109 @@ def rotate_document(image):
 	_, binary = cv2.threshold(gray, 240, 255, cv2.THRESH_BINARY)
 
 	# Invert the binary image: non-white areas are now white, and white areas are black
-	binary = cv2.bitwise_not(binary)
+	return cv2.bitwise_not(binary)
 
-	# Find all non-white pixels (i.e., content areas)
-	coords = np.column_stack(np.where(binary > 0))
 
-	# If no content is found, return the original image
-	if len(coords) == 0:
-		return image
+def min_area_rect_skew(binary):
+	"""Angle of the tightest rotated box around all content.
+
+	Confidence is how much of that box the content's convex hull fills, which
+	drops when stamps or margin marks stretch the box.
+	"""
+	# Find all non-white pixels (i.e., content areas) as (y, x) rows
+	coords = cv2.findNonZero(binary)
+
+	# If no content is found, there is nothing to align
+	if coords is None:
+		return None, 0.0
+	coords = np.ascontiguousarray(coords.reshape(-1, 2)[:, ::-1])
 
 	# Get the minimum area bounding box around the content
 	rect = cv2.minAreaRect(coords)
 
-	# Get the rotation angle from the bounding box
-	angle = rect[2]
+	# Get the rotation angle from the bounding box, in the (0, 90] range of OpenCV 4.5+
+	angle = rect[2] % 90 or 90.0
 	if angle < 45:
 		angle = - angle
 	else:
 		angle = 90 - angle
 
+	rect_area = rect[1][0] * rect[1][1]
+	confidence = cv2.contourArea(cv2.convexHull(coords)) / rect_area if rect_area else 0.0
+	return angle, confidence
+
+
+def projection_profile_skew(binary, max_angle=15.0, steps=(1.0, 0.2, 0.05), max_points=200000):
+	"""Angle that makes the content's row profile sharpest, searched coarse to fine.
+
+	Content pixels are projected onto the vertical axis at each candidate angle;
+	text lines give the most peaked histogram when they are level. The search
+	sweeps [-max_angle, max_angle] with steps[0], then refines around the best
+	angle with each finer step. Confidence is how far the best score stands
+	above the median score of the coarse sweep, from 0 to 1.
+	"""
+	coords = cv2.findNonZero(binary)
+	if coords is None:
+		return None, 0.0
+	coords = coords.reshape(-1, 2).astype(np.float32)
+	if len(coords) > max_points:
+		coords = coords[np.linspace(0, len(coords) - 1, max_points).astype(np.int64)]
+	xs = coords[:, 0] - binary.shape[1] / 2.0
+	ys = coords[:, 1] - binary.shape[0] / 2.0
+	bins = int(np.hypot(*binary.shape)) + 2
+
+	def score(angle):
+		# Row each pixel lands on after rotating the page by angle (as cv2.getRotationMatrix2D does)
+		theta = np.deg2rad(angle)
+		rows = (ys * np.cos(theta) - xs * np.sin(theta) + bins / 2).astype(np.int64)
+		profile = np.bincount(rows, minlength=bins).astype(np.float64)
+		return float(np.sum(np.diff(profile) ** 2))
+
+	candidates = np.arange(-max_angle, max_angle + steps[0] / 2, steps[0])
+	coarse_scores = [score(angle) for angle in candidates]
+	best = float(candidates[int(np.argmax(coarse_scores))])
+	best_score = max(coarse_scores)
+
+	previous_step = steps[0]
+	for step in steps[1:]:
+		for angle in np.arange(best - previous_step, best + previous_step + step / 2, step):
+			angle_score = score(angle)
+			if angle_score > best_score:
+				best, best_score = float(angle), angle_score
+		previous_step = step
+
+	confidence = 1.0 - float(np.median(coarse_scores)) / best_score if best_score else 0.0
+	return best, confidence
+
+
+# Skew estimators by name; each takes a content mask and returns (angle, confidence)
+SKEW_ENGINES = {
+	"minarearect": min_area_rect_skew,
+	"projection": projection_profile_skew,
+}
+
+
+def detect_skew(image, max_side=None, engine="minarearect"):
+	"""Return (angle, confidence) for deskewing the document; angle is None if there is no content."""
+	return SKEW_ENGINES[engine](content_mask(image, max_side))
+
+
+def estimate_skew(image, max_side=None, engine="minarearect"):
+	"""Return the angle that deskews the document, or None if there is no content."""
+	return detect_skew(image, max_side, engine)[0]
+
+
+def rotate_document(image, max_side=None, engine="minarearect"):
+	angle = estimate_skew(image, max_side, engine)
+
+	# If no content is found, return the original image
+	if angle is None:
+		return image
+
+	return rotate_by(image, angle)
+
+
+def rotate_by(image, angle):
 	# Get the center of the image
 	(h, w) = image.shape[:2]
 	center = (w // 2, h // 2)
@@ -46,12 +149,16 @@ def rotate_document(image):
 	return rotated
 
 
+# Longest side, in pixels, of the page copy the skew angle is measured on
+ESTIMATE_MAX_SIDE = 1200
+
+
 def load_image():
 	filepath = filedialog.askopenfilename()
 	if not filepath:
 		return
 	image = cv2.imread(filepath)
-	aligned_image = rotate_document(image)
+	aligned_image = rotate_document(image, max_side=ESTIMATE_MAX_SIDE, engine=engine_var.get())
 	if aligned_image is not None:
 		display_image(aligned_image)
 	else:
@@ -66,18 +173,223 @@ def display_image(cv_img):
 	canvas.image = img
 
 
-# Set up the Tkinter interface
-app = tk.Tk()
-app.title("Document Aligner")
-app.geometry("800x900")
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+def iter_pages(inputs):
+	"""Yield (path, page_index, output_name) for every page, opening files one at a time.
+
+	Multi-page TIFFs contribute one entry per page; only their headers are read here.
+	"""
+	for item in inputs:
+		if os.path.isdir(item):
+			paths = sorted(os.path.join(item, name) for name in os.listdir(item))
+		else:
+			paths = [item]
+		for path in paths:
+			if not os.path.isfile(path) or not path.lower().endswith(IMAGE_EXTENSIONS):
+				continue
+			stem = os.path.splitext(os.path.basename(path))[0]
+			pages = 1
+			if path.lower().endswith(TIFF_EXTENSIONS):
+				with Image.open(path) as tiff:
+					pages = getattr(tiff, "n_frames", 1)
+			if pages == 1:
+				yield path, 0, stem
+			else:
+				for page_index in range(pages):
+					yield path, page_index, "{}_p{:04d}".format(stem, page_index + 1)
+
+
+def read_page(path, page_index):
+	"""Decode a single page of an image or multi-page TIFF as a BGR array."""
+	if path.lower().endswith(TIFF_EXTENSIONS):
+		with Image.open(path) as tiff:
+			tiff.seek(page_index)
+			return cv2.cvtColor(np.asarray(tiff.convert("RGB")), cv2.COLOR_RGB2BGR)
+	return cv2.imread(path)
+
+
+def _init_worker():
+	# The pool already keeps every core busy with a page each; warpAffine's own threads would only contend
+	cv2.setNumThreads(1)
+
+
+def deskew_page(job):
+	"""Deskew one page and return it encoded. Runs inside a worker process.
+
+	Also returns the worker's own peak RSS, since the parent cannot see it while
+	the worker is still alive.
+	"""
+	path, page_index, name, max_side, engine, ext = job
+	image = read_page(path, page_index)
+	if image is None:
+		return name, None, None, peak_rss_mb()
+	angle = estimate_skew(image, max_side, engine)
+	if angle is not None:
+		image = rotate_by(image, angle)
+	ok, encoded = cv2.imencode(ext, image)
+	return name, encoded.tobytes() if ok else None, angle, peak_rss_mb()
+
+
+def peak_rss_mb():
+	"""Peak resident memory of the calling process in MB, or None where it cannot be measured."""
+	try:
+		# Unix only; imported here so the script still runs on Windows
+		import resource
+	except ImportError:
+		return None
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	# ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+	return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def format_mb(value):
+	return "n/a" if value is None else "{:.0f} MB".format(value)
+
+
+def run_batch(inputs, output_dir, max_side=ESTIMATE_MAX_SIDE, workers=None, ext=".png", log_every=100,
+			  engine="minarearect"):
+	"""Deskew every page under inputs in a process pool, writing results in input order.
+
+	Pages are read lazily and at most a few per worker are in flight, so memory
+	does not grow with the number of pages.
+	"""
+	os.makedirs(output_dir, exist_ok=True)
+	workers = workers or os.cpu_count()
+	jobs = ((path, page_index, name, max_side, engine, ext) for path, page_index, name in iter_pages(inputs))
+	pending = deque()
+	done = 0
+	failed = 0
+	worker_peak = None
+	start = time.perf_counter()
+
+	with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+		while True:
+			while len(pending) < workers * 2:
+				job = next(jobs, None)
+				if job is None:
+					break
+				pending.append(pool.submit(deskew_page, job))
+			if not pending:
+				break
+
+			name, encoded, angle, page_peak = pending.popleft().result()
+			if page_peak is not None:
+				worker_peak = page_peak if worker_peak is None else max(worker_peak, page_peak)
+			if encoded is None:
+				failed += 1
+				print("{}: could not process page".format(name))
+			else:
+				with open(os.path.join(output_dir, name + ext), 'wb') as f:
+					f.write(encoded)
+			done += 1
+
+			if done % log_every == 0:
+				elapsed = time.perf_counter() - start
+				print("{} pages, {:.1f} pages/s, peak RSS {} (largest worker {})".format(
+					done, done / elapsed, format_mb(peak_rss_mb()), format_mb(worker_peak)))
+
+	elapsed = time.perf_counter() - start
+	print("Deskewed {} pages in {:.1f}s ({:.1f} pages/s), {} failed, peak RSS {} (largest worker {})".format(
+		done, elapsed, done / elapsed if elapsed else 0.0, failed, format_mb(peak_rss_mb()), format_mb(worker_peak)))
+	return done, failed
+
+
+def make_synthetic_page(angle, width=1240, height=1754, seed=0, clutter=True):
+	"""Draw a text-like page rotated by angle degrees, optionally with an upright stamp and a scanner edge."""
+	rng = np.random.RandomState(seed)
+	page = np.full((height, width, 3), 255, np.uint8)
+	line_height = max(3, height // 220)
+	for y in range(height // 10, height * 9 // 10, line_height * 4):
+		x = width // 8
+		while x < width * 7 // 8:
+			word = rng.randint(width // 80, width // 20)
+			cv2.rectangle(page, (x, y), (min(x + word, width * 7 // 8), y + line_height), (0, 0, 0), -1)
+			x += word + rng.randint(width // 150, width // 60)
+	page = rotate_by(page, angle)
+	if clutter:
+		# Things that do not rotate with the text: a stamp in the margin and a dark scanner edge
+		cv2.circle(page, (width - width // 12, height // 14), width // 18, (60, 60, 200), -1)
+		page[:, :width // 100] = 40
+	return page
+
+
+def benchmark_engines(angles=(-12.0, -7.5, -3.2, -0.8, 0.0, 0.6, 2.5, 5.0, 9.3, 14.0), max_side=ESTIMATE_MAX_SIDE):
+	"""Time every skew engine and measure its angle error on synthetic pages, clean and cluttered."""
+	results = {}
+	for engine in sorted(SKEW_ENGINES):
+		for clutter in (False, True):
+			errors = []
+			elapsed = 0.0
+			for seed, angle in enumerate(angles):
+				page = make_synthetic_page(angle, seed=seed, clutter=clutter)
+				start = time.perf_counter()
+				estimate, _ = detect_skew(page, max_side, engine)
+				elapsed += time.perf_counter() - start
+				# Pages were rotated by angle, so the deskew angle should be -angle
+				errors.append(abs((estimate if estimate is not None else 0.0) + angle))
+			results[(engine, clutter)] = {
+				"ms_per_page": 1000 * elapsed / len(angles),
+				"mean_error": float(np.mean(errors)),
+				"max_error": float(np.max(errors)),
+			}
+	return results
+
+
+def print_benchmark(results):
+	print("{:<12} {:<10} {:>10} {:>12} {:>11}".format("engine", "pages", "ms/page", "mean error", "max error"))
+	for (engine, clutter), result in sorted(results.items()):
+		print("{:<12} {:<10} {:>10.1f} {:>11.2f}d {:>10.2f}d".format(
+			engine, "cluttered" if clutter else "clean", result["ms_per_page"], result["mean_error"],
+			result["max_error"]))
+
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description="Deskew scanned pages in bulk without the GUI.")
+	parser.add_argument("inputs", nargs="*", help="image files, multi-page TIFFs or directories of them")
+	parser.add_argument("-o", "--output-dir", default="deskewed", help="directory for the deskewed pages")
+	parser.add_argument("--max-side", type=int, default=ESTIMATE_MAX_SIDE,
+						help="longest side of the page copy the angle is measured on (0 for full resolution)")
+	parser.add_argument("--engine", choices=sorted(SKEW_ENGINES), default="minarearect", help="skew estimator")
+	parser.add_argument("--ext", default=".png", help="output image format extension")
+	parser.add_argument("-j", "--workers", type=int, help="number of worker processes (default: all cores)")
+	parser.add_argument("--benchmark", action="store_true",
+						help="compare the skew engines on synthetic rotated pages instead of processing inputs")
+	args = parser.parse_args(argv)
+
+	if args.benchmark:
+		print_benchmark(benchmark_engines(max_side=args.max_side or None))
+		return 0
+	if not args.inputs:
+		parser.error("no inputs given")
+
+	done, failed = run_batch(args.inputs, args.output_dir, args.max_side or None, args.workers, args.ext,
+							 engine=args.engine)
+	return 1 if failed or not done else 0
+
+
+if __name__ == "__main__":
+	if len(sys.argv) > 1:
+		sys.exit(main())
+
+	# Set up the Tkinter interface
+	app = tk.Tk()
+	app.title("Document Aligner")
+	app.geometry("800x900")
+
+	canvas = tk.Canvas(app, width=800, height=800)
+	canvas.pack()
 
-canvas = tk.Canvas(app, width=800, height=800)
-canvas.pack()
+	button_frame = tk.Frame(app)
+	button_frame.pack(fill=tk.X, side=tk.BOTTOM)
 
-button_frame = tk.Frame(app)
-button_frame.pack(fill=tk.X, side=tk.BOTTOM)
+	load_btn = tk.Button(button_frame, text="Load Image", command=load_image)
+	load_btn.pack(side=tk.LEFT, padx=10, pady=10)
 
-load_btn = tk.Button(button_frame, text="Load Image", command=load_image)
-load_btn.pack(side=tk.LEFT, padx=10, pady=10)
+	engine_var = tk.StringVar(value="minarearect")
+	engine_menu = tk.OptionMenu(button_frame, engine_var, *sorted(SKEW_ENGINES))
+	engine_menu.pack(side=tk.LEFT, padx=10, pady=10)
 
-app.mainloop()
+	app.mainloop()
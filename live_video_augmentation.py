@@ -1,15 +1,121 @@
+import threading
+import time
+
 import cv2
 import numpy as np
 import tkinter as tk
 from tkinter import ttk, Scale
+from pencil_sketch_conversion import SketchEngine
+
+SEPIA_MATRIX = np.array([[0.272, 0.534, 0.131],
+                         [0.349, 0.686, 0.168],
+                         [0.393, 0.769, 0.189]])
+
+
+class AugmentationEngine:
+    """Applies the selected augmentation and the brightness scale in about one pass per frame.
+
+    configure() precomputes everything that depends only on the settings, so it
+    runs when a setting changes rather than on every frame. Sepia gets the
+    brightness folded into its colour matrix when brightening; when dimming it
+    must saturate at 255 before scaling, so the scale stays a separate pass.
+    Grayscale and Sketch scale the single gray channel before expanding it to BGR.
+    """
+
+    def __init__(self, sketch_engine):
+        self.sketch_engine = sketch_engine
+        self.configure("None", 50)
+
+    def configure(self, aug_type, brightness):
+        self.aug_type = aug_type
+        self.alpha = brightness / 50
+        # Folding alpha < 1 into the matrix would scale values above 255 down before they saturate
+        self.sepia_matrix = SEPIA_MATRIX * self.alpha if self.alpha >= 1 else SEPIA_MATRIX
+
+    def scale(self, frame):
+        # convertScaleAbs rounds and saturates in one SIMD pass; a 256-entry cv2.LUT measured slower
+        return frame if self.alpha == 1 else cv2.convertScaleAbs(frame, alpha=self.alpha)
+
+    def apply(self, frame):
+        if self.aug_type == "Grayscale":
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            return cv2.cvtColor(self.scale(gray), cv2.COLOR_GRAY2BGR)
+        if self.aug_type == "Sepia":
+            # cv2.transform saturates to 0..255; for alpha >= 1 it also applies the brightness
+            sepia = cv2.transform(frame, self.sepia_matrix)
+            return sepia if self.alpha >= 1 else self.scale(sepia)
+        if self.aug_type == "Sketch":
+            sketch = self.sketch_engine.sketch(frame)
+            return cv2.cvtColor(self.scale(sketch), cv2.COLOR_GRAY2BGR)
+        return self.scale(frame)
+
+
+class LatestFrameCapture:
+    """Reads a camera on its own thread and keeps only the newest frame.
+
+    The driver buffer is drained as fast as the camera delivers, so a slow
+    consumer always gets the most recent frame instead of a backlog. Frames that
+    are replaced before anyone reads them are counted as dropped.
+    """
+
+    def __init__(self, source=0):
+        self.cap = cv2.VideoCapture(source)
+        self.lock = threading.Lock()
+        self.frame = None
+        self.captured_at = None
+        self.is_new = False
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running and self.cap.isOpened():
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            with self.lock:
+                if self.is_new:
+                    self.frames_dropped += 1
+                self.frame = frame
+                self.captured_at = time.perf_counter()
+                self.is_new = True
+                self.frames_captured += 1
+
+    def latest(self):
+        """Return (frame, captured_at) for a frame not returned before, or (None, None)."""
+        with self.lock:
+            if not self.is_new:
+                return None, None
+            self.is_new = False
+            return self.frame, self.captured_at
+
+    def release(self):
+        self.running = False
+        self.thread.join(timeout=1.0)
+        self.cap.release()
+
 
 class VideoAugmentationApp:
     def __init__(self, window):
         self.window = window
         self.window.title("Live Video Augmentation")
         
-        self.cap = cv2.VideoCapture(0)
+        self.capture = LatestFrameCapture(0)
         self.aug_type = tk.StringVar(value="None")
+        self.augmentation = AugmentationEngine(SketchEngine(blur_scale=0.5))
+
+        # Display state: the Tk image is reused until the window size changes
+        self.display_size = (640, 480)
+        self.photo = None
+        self.ppm_buffer = None
+        self.rgb_view = None
+        self.display_fps = 0.0
+        self.last_display_time = None
+        self.latency_ms = None
+        self.window.bind("<Configure>", self.on_resize)
         
         self.create_widgets()
         self.update()
@@ -22,8 +128,10 @@ class VideoAugmentationApp:
         
         self.aug_selection = ttk.Combobox(self.window, textvariable=self.aug_type, values=["None", "Grayscale", "Sepia", "Sketch"], state="readonly")
         self.aug_selection.grid(row=1, column=1, padx=5, pady=5)
+        self.aug_selection.bind("<<ComboboxSelected>>", self.on_settings_changed)
 
-        self.brightness_slider = Scale(self.window, from_=0, to=100, orient='horizontal', label='Brightness')
+        self.brightness_slider = Scale(self.window, from_=0, to=100, orient='horizontal', label='Brightness',
+                                       command=self.on_settings_changed)
         self.brightness_slider.set(50)
         self.brightness_slider.grid(row=1, column=2, padx=5, pady=5)
         
@@ -31,46 +139,64 @@ class VideoAugmentationApp:
         self.quit_button.grid(row=1, column=3, padx=5, pady=5)
 
     def update(self):
-        ret, frame = self.cap.read()
-        if ret:
-            frame = self.apply_augmentation(frame)
-            frame = self.adjust_brightness(frame)
-            self.display_frame(frame)
-        self.window.after(10, self.update)
-
-    def apply_augmentation(self, frame):
-        aug_type = self.aug_type.get()
-        if aug_type == "Grayscale":
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-        elif aug_type == "Sepia":
-            frame = cv2.transform(frame, np.array([[0.272, 0.534, 0.131],
-                                                   [0.349, 0.686, 0.168],
-                                                   [0.393, 0.769, 0.189]]))
-            frame = np.clip(frame, 0, 255)
-        elif aug_type == "Sketch":
-            gray_img = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            inv_img = cv2.bitwise_not(gray_img)
-            blur_img = cv2.GaussianBlur(inv_img, (21,21), 0)
-            inv_blur_img = cv2.bitwise_not(blur_img)
-            frame = cv2.divide(gray_img, inv_blur_img, scale=256.0)
-            frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-        return frame
-
-    def adjust_brightness(self, frame):
-        brightness = self.brightness_slider.get()
-        brightness_adjusted = cv2.convertScaleAbs(frame, alpha=brightness/50)
-        return brightness_adjusted
-
-    def display_frame(self, frame):
-        img = cv2.resize(frame, (640, 480))
-        imgtk = cv2.imencode('.png', img)[1].tobytes()
-        tkimg = tk.PhotoImage(data=imgtk)
-        self.video_label.imgtk = tkimg
-        self.video_label.configure(image=tkimg)
+        # Never blocks: take the newest captured frame, if there is one we have not shown yet
+        frame, captured_at = self.capture.latest()
+        if frame is not None:
+            frame = self.augmentation.apply(frame)
+            self.display_frame(frame, captured_at)
+        self.window.after(5, self.update)
+
+    def on_settings_changed(self, _event=None):
+        # Recompile the augmentation only when the effect or brightness actually changes
+        self.augmentation.configure(self.aug_type.get(), self.brightness_slider.get())
+
+    def on_resize(self, event):
+        # Only react to the window itself once the picture is showing, so the first layout keeps 640x480
+        if event.widget is not self.window or self.photo is None or event.width == self.display_size[0]:
+            return
+        # Follow the window width, keeping a 4:3 picture
+        width = max(160, event.width)
+        self.display_size = (width, width * 3 // 4)
+
+    def create_display_image(self, width, height):
+        """Allocate the Tk image and a binary PPM buffer whose pixel area frames are written into."""
+        header = 'P6 {} {} 255 '.format(width, height).encode()
+        self.ppm_buffer = bytearray(len(header) + width * height * 3)
+        self.ppm_buffer[:len(header)] = header
+        self.rgb_view = np.frombuffer(self.ppm_buffer, np.uint8, offset=len(header)).reshape(height, width, 3)
+        self.photo = tk.PhotoImage(width=width, height=height)
+        self.video_label.imgtk = self.photo
+        self.video_label.configure(image=self.photo)
+
+    def display_frame(self, frame, captured_at=None):
+        width, height = self.display_size
+        if frame.shape[1] != width or frame.shape[0] != height:
+            frame = cv2.resize(frame, (width, height))
+        if self.photo is None or self.rgb_view.shape[:2] != (height, width):
+            self.create_display_image(width, height)
+
+        # Write the RGB pixels straight behind the PPM header; Tk reads raw PPM without any decoding
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb_view)
+        self.draw_overlay(self.rgb_view, captured_at)
+        self.photo.configure(data=bytes(self.ppm_buffer), format='PPM')
+
+    def draw_overlay(self, rgb, captured_at):
+        now = time.perf_counter()
+        if self.last_display_time is not None:
+            fps = 1.0 / max(now - self.last_display_time, 1e-6)
+            self.display_fps = fps if not self.display_fps else 0.9 * self.display_fps + 0.1 * fps
+        self.last_display_time = now
+
+        text = "{:.1f} FPS".format(self.display_fps)
+        if captured_at is not None:
+            self.latency_ms = 1000 * (now - captured_at)
+            text += "  latency {:.1f} ms".format(self.latency_ms)
+        text += "  dropped {}".format(self.capture.frames_dropped)
+        cv2.putText(rgb, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 0), 3)
+        cv2.putText(rgb, text, (10, 25), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 1)
     
     def quit_app(self):
-        self.cap.release()
+        self.capture.release()
         self.window.destroy()
 
 if __name__ == "__main__":
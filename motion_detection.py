@@ -1,13 +1,233 @@
+import argparse
+import queue
+import sys
+import threading
+import time
+
 import cv2
+import numpy as np
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 
+
+class FrameDiffDetector:
+    """Finds moving regions by differencing each blurred gray frame with the previous one."""
+
+    def __init__(self, min_area=500):
+        self.min_area = min_area
+        self.prev_gray = None
+
+    def detect(self, frame):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (21, 21), 0)
+        if self.prev_gray is None or self.prev_gray.shape != gray.shape:
+            self.prev_gray = gray
+            return []
+
+        delta_frame = cv2.absdiff(self.prev_gray, gray)
+        self.prev_gray = gray
+        thresh = cv2.threshold(delta_frame, 25, 255, cv2.THRESH_BINARY)[1]
+        thresh = cv2.dilate(thresh, None, iterations=2)
+
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [cv2.boundingRect(contour) for contour in contours if cv2.contourArea(contour) >= self.min_area]
+
+
+class RunningAverageDetector:
+    """Finds moving regions against an exponentially weighted background, on a shrunken gray frame.
+
+    The background adapts with weight alpha per frame, so slow movers that barely
+    change between consecutive frames still stand out against it. All the work
+    runs at scale times the frame size with a correspondingly smaller blur, and
+    boxes (and min_area) are mapped back to full-resolution pixels.
+    """
+
+    def __init__(self, min_area=500, scale=0.25, alpha=0.05, threshold=25):
+        self.min_area = min_area
+        self.scale = scale
+        self.alpha = alpha
+        self.threshold = threshold
+        self.kernel = max(3, int(round(21 * scale)) | 1)
+        self.background = None
+
+    def detect(self, frame):
+        height, width = frame.shape[:2]
+        small_size = (max(1, int(round(width * self.scale))), max(1, int(round(height * self.scale))))
+        small = cv2.resize(frame, small_size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        gray = cv2.GaussianBlur(gray, (self.kernel, self.kernel), 0)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            return []
+
+        delta_frame = cv2.absdiff(gray, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(gray, self.background, self.alpha)
+        thresh = cv2.threshold(delta_frame, self.threshold, 255, cv2.THRESH_BINARY)[1]
+        thresh = cv2.dilate(thresh, None, iterations=2)
+
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        fx, fy = width / float(small_size[0]), height / float(small_size[1])
+        min_area = self.min_area / (fx * fy)
+        boxes = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((int(x * fx), int(y * fy), int(np.ceil(w * fx)), int(np.ceil(h * fy))))
+        return boxes
+
+
+DETECTORS = {
+    "Frame difference": FrameDiffDetector,
+    "Running average": RunningAverageDetector,
+}
+
+
+def make_synthetic_frames(frames=200, size=(1280, 720), seed=0):
+    """Yield (frame, {name: box}) with a fast and a slow flat-coloured target over a noisy background."""
+    rng = np.random.RandomState(seed)
+    width, height = size
+    background = cv2.GaussianBlur(rng.randint(0, 256, (height, width, 3)).astype(np.uint8), (21, 21), 0)
+    box_w, box_h = width // 10, height // 8
+    for i in range(frames):
+        frame = background.copy()
+        # Camera noise, so that an unchanged scene still differs a little from frame to frame
+        noise = rng.randint(-4, 5, (height, width, 1)).astype(np.int16)
+        frame = np.clip(frame + noise, 0, 255).astype(np.uint8)
+        # The fast target crosses the frame about every 100 frames, bouncing off the edges;
+        # the slow one moves a twentieth as fast.
+        travel = (i * width // 100) % (2 * (width - box_w))
+        boxes = {
+            "fast": (min(travel, 2 * (width - box_w) - travel), height // 6, box_w, box_h),
+            "slow": (width // 4 + i * width // 2000, height // 2, box_w, box_h),
+        }
+        for (x, y, w, h), colour in ((boxes["fast"], (40, 220, 250)), (boxes["slow"], (200, 60, 60))):
+            cv2.rectangle(frame, (x, y), (x + w - 1, y + h - 1), colour, -1)
+        yield frame, boxes
+
+
+def _overlaps(box_a, box_b):
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
+
+
+def benchmark_detectors(frames=200, size=(1280, 720), detectors=None):
+    """Time each detector on synthetic frames and count the frames in which it finds each target.
+
+    Returns {name: {"ms": per-frame ms, "fast": hit rate, "slow": hit rate}}.
+    The first few frames are skipped for scoring while the models warm up.
+    """
+    detectors = detectors or DETECTORS
+    data = list(make_synthetic_frames(frames, size))
+    warmup = 5
+    results = {}
+    for name, detector_class in detectors.items():
+        detector = detector_class()
+        hits = {"fast": 0, "slow": 0}
+        seconds = 0.0
+        for i, (frame, targets) in enumerate(data):
+            start = time.perf_counter()
+            boxes = detector.detect(frame)
+            seconds += time.perf_counter() - start
+            if i < warmup:
+                continue
+            for target, target_box in targets.items():
+                if any(_overlaps(box, target_box) for box in boxes):
+                    hits[target] += 1
+        scored = len(data) - warmup
+        results[name] = {"ms": 1000 * seconds / len(data), "fast": hits["fast"] / float(scored),
+                         "slow": hits["slow"] / float(scored)}
+    return results
+
+
+class MotionWorker:
+    """Runs capture and detection off the Tk thread and queues annotated frames for display.
+
+    The capture thread keeps only the newest frame, so detection always works on
+    the most recent picture instead of a backlog. Results go into a short queue
+    that the GUI polls; when the GUI falls behind, the oldest result is dropped.
+    stop() returns once both threads have finished, leaving the capture open so
+    the next start() does not have to reopen the camera.
+    """
+
+    def __init__(self, cap, detector):
+        self.cap = cap
+        self.detector = detector
+        self.results = queue.Queue(maxsize=2)
+        self.stop_event = threading.Event()
+        self.frame_ready = threading.Condition()
+        self.frame = None
+        self.captured_at = None
+        self.fps = 0.0
+        self.latency_ms = 0.0
+        self.threads = [threading.Thread(target=self._capture, daemon=True),
+                        threading.Thread(target=self._detect, daemon=True)]
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.frame_ready:
+            self.frame_ready.notify_all()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+
+    def _capture(self):
+        while not self.stop_event.is_set():
+            ret, frame = self.cap.read()
+            if not ret:
+                time.sleep(0.01)
+                continue
+            with self.frame_ready:
+                self.frame = frame
+                self.captured_at = time.perf_counter()
+                self.frame_ready.notify()
+
+    def _detect(self):
+        last_done = None
+        while not self.stop_event.is_set():
+            with self.frame_ready:
+                while self.frame is None and not self.stop_event.is_set():
+                    self.frame_ready.wait(0.1)
+                if self.stop_event.is_set():
+                    break
+                frame, captured_at = self.frame, self.captured_at
+                self.frame = None
+
+            for (x, y, w, h) in self.detector.detect(frame):
+                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+
+            done = time.perf_counter()
+            if last_done is not None:
+                fps = 1.0 / max(done - last_done, 1e-6)
+                self.fps = fps if not self.fps else 0.9 * self.fps + 0.1 * fps
+            last_done = done
+            self.latency_ms = 1000 * (done - captured_at)
+
+            try:
+                self.results.put_nowait(frame)
+            except queue.Full:
+                try:
+                    self.results.get_nowait()
+                except queue.Empty:
+                    pass
+                self.results.put_nowait(frame)
+
+
 class MotionDetectionApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Motion Detection")
-        self.root.geometry("300x150")
+        self.root.geometry("300x190")
+
+        self.method = tk.StringVar(value="Running average")
+        self.method_selection = ttk.Combobox(root, textvariable=self.method, values=list(DETECTORS),
+                                             state="readonly")
+        self.method_selection.pack(pady=(10, 0))
 
         self.start_button = ttk.Button(root, text="Start Detection", command=self.start_detection)
         self.start_button.pack(pady=10)
@@ -20,57 +240,89 @@ class MotionDetectionApp:
 
         self.running = False
         self.cap = None
+        self.worker = None
+        self.poll_id = None
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def start_detection(self):
+        # The camera is opened once and reused for every run
+        if self.cap is None or not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(0)
+            if not self.cap.isOpened():
+                self.cap = None
+                messagebox.showerror("Error", "Could not open the camera.")
+                return
+
         self.running = True
         self.start_button.configure(state=tk.DISABLED)
         self.stop_button.configure(state=tk.NORMAL)
+        self.method_selection.configure(state=tk.DISABLED)
         self.status_label.configure(text="Status: Running")
-        self.detect_motion()
+        self.worker = MotionWorker(self.cap, DETECTORS[self.method.get()]())
+        self.worker.start()
+        self.poll_id = self.root.after(15, self.poll_results)
 
     def stop_detection(self):
         self.running = False
+        if self.poll_id is not None:
+            self.root.after_cancel(self.poll_id)
+            self.poll_id = None
+        if self.worker:
+            self.worker.stop()
+            self.worker = None
         self.start_button.configure(state=tk.NORMAL)
         self.stop_button.configure(state=tk.DISABLED)
+        self.method_selection.configure(state="readonly")
         self.status_label.configure(text="Status: Not running")
-        if self.cap:
-            self.cap.release()
-            cv2.destroyAllWindows()
-
-    def detect_motion(self):
-        self.cap = cv2.VideoCapture(0)
-        _, prev_frame = self.cap.read()
-        prev_gray = cv2.cvtColor(prev_frame, cv2.COLOR_BGR2GRAY)
-        prev_gray = cv2.GaussianBlur(prev_gray, (21, 21), 0)
-
-        while self.running:
-            _, frame = self.cap.read()
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            gray = cv2.GaussianBlur(gray, (21, 21), 0)
-
-            delta_frame = cv2.absdiff(prev_gray, gray)
-            thresh = cv2.threshold(delta_frame, 25, 255, cv2.THRESH_BINARY)[1]
-            thresh = cv2.dilate(thresh, None, iterations=2)
-            
-            contours, _ = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            for contour in contours:
-                if cv2.contourArea(contour) < 500:
-                    continue
-                (x, y, w, h) = cv2.boundingRect(contour)
-                cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.destroyAllWindows()
+
+    def poll_results(self):
+        self.poll_id = None
+        frame = None
+        # Show only the newest result; anything older is already stale
+        while True:
+            try:
+                frame = self.worker.results.get_nowait()
+            except queue.Empty:
+                break
 
+        if frame is not None:
             cv2.imshow("Motion Detection", frame)
-            key = cv2.waitKey(1) & 0xFF
+            self.status_label.configure(text="Status: Running, {:.1f} FPS, {:.0f} ms latency".format(
+                self.worker.fps, self.worker.latency_ms))
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            self.stop_detection()
+            return
+        self.poll_id = self.root.after(15, self.poll_results)
+
+    def on_close(self):
+        if self.running:
+            self.stop_detection()
+        if self.cap:
+            self.cap.release()
+        self.root.destroy()
 
-            if key == ord('q') or not self.running:
-                break
 
-            prev_gray = gray.copy()
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the motion detectors on synthetic frames.")
+    parser.add_argument("--benchmark", action="store_true", help="time each detector and report its hit rates")
+    parser.add_argument("--frames", type=int, default=200, help="number of synthetic frames")
+    parser.add_argument("--size", default="1280x720", help="frame size, e.g. 1920x1080")
+    args = parser.parse_args(argv)
 
-        self.stop_detection()
+    if not args.benchmark:
+        parser.error("nothing to do; pass --benchmark or run without arguments for the GUI")
+    size = tuple(int(v) for v in args.size.lower().split('x'))
+    for name, result in benchmark_detectors(args.frames, size).items():
+        print("{:<18} {:>7.2f} ms/frame  fast target found {:>5.1%}  slow target found {:>5.1%}".format(
+            name, result["ms"], result["fast"], result["slow"]))
+    return 0
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
     root = tk.Tk()
     app = MotionDetectionApp(root)
     root.mainloop()
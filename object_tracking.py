@@ -1,5 +1,15 @@
+import argparse
+import csv
+import json
+import multiprocessing
 import cv2
+import numpy as np
+import os
+import re
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 def select_tracker(tracker_type):
     if tracker_type == 'BOOSTING':
@@ -19,8 +29,732 @@ def select_tracker(tracker_type):
     else:
         raise ValueError('Unsupported tracker type')
 
+TRACKER_TYPES = ['BOOSTING', 'MIL', 'KCF', 'TLD', 'MEDIANFLOW', 'MOSSE', 'CSRT']
+# Trackers that keep their accuracy in a search window: MEDIANFLOW rebuilds its model from the last
+# two frames anyway, and BOOSTING otherwise searches far more than it needs to. The others learn a
+# model over many frames that every move of the window throws away, and drift because of it (TLD
+# too, at 4K).
+CROP_TRACKER_TYPES = ['BOOSTING', 'MEDIANFLOW']
+
+class MultiObjectTracker:
+    """Tracks many objects with one tracker each, updating them concurrently.
+
+    OpenCV releases the GIL inside tracker.update(), so a thread pool spreads the
+    per-object updates over the available cores. A track that fails for
+    max_failures consecutive frames is dropped. Creating one limits OpenCV to a
+    single internal thread per call for the whole process.
+    """
+
+    def __init__(self, tracker_type, max_workers=None, max_failures=5):
+        self.tracker_type = tracker_type
+        self.max_failures = max_failures
+        # The pool already keeps every core busy; OpenCV's own threads on top would only oversubscribe them
+        cv2.setNumThreads(1)
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count())
+        self.tracks = {}
+        self.next_id = 0
+
+        self.frames = 0
+        self.update_time = 0.0
+        self.last_update_ms = 0.0
+        self.cpu_time = 0.0
+        self.last_cpu_percent = 0.0
+
+    def add(self, frame, bbox):
+        tracker = select_tracker(self.tracker_type)
+        tracker.init(frame, tuple(int(v) for v in bbox))
+        track_id = self.next_id
+        self.next_id += 1
+        self.tracks[track_id] = {"tracker": tracker, "bbox": tuple(bbox), "failures": 0}
+        return track_id
+
+    def update(self, frame):
+        """Update every track on frame and return {track_id: (ok, bbox)} for the tracks still alive."""
+        start, cpu_start = time.perf_counter(), time.process_time()
+        track_ids = list(self.tracks)
+        results = list(self.pool.map(lambda track_id: self.tracks[track_id]["tracker"].update(frame), track_ids))
+
+        for track_id, (ok, bbox) in zip(track_ids, results):
+            track = self.tracks[track_id]
+            if ok:
+                track["bbox"] = tuple(bbox)
+                track["failures"] = 0
+            else:
+                track["failures"] += 1
+                if track["failures"] >= self.max_failures:
+                    del self.tracks[track_id]
+
+        elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+        self.frames += 1
+        self.update_time += elapsed
+        self.cpu_time += cpu
+        self.last_update_ms = 1000 * elapsed
+        # Can exceed 100% when several cores are busy
+        self.last_cpu_percent = 100 * cpu / elapsed if elapsed else 0.0
+        return {track_id: (self.tracks[track_id]["failures"] == 0, self.tracks[track_id]["bbox"])
+                for track_id in self.tracks}
+
+    def stats(self):
+        return {
+            "tracks": len(self.tracks),
+            "frames": self.frames,
+            "avg_update_ms": 1000 * self.update_time / self.frames if self.frames else 0.0,
+            "last_update_ms": self.last_update_ms,
+            "avg_cpu_percent": 100 * self.cpu_time / self.update_time if self.update_time else 0.0,
+            "last_cpu_percent": self.last_cpu_percent,
+        }
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def iou(box_a, box_b):
+    """Intersection over union of two (x, y, w, h) boxes."""
+    ax, ay, aw, ah = box_a
+    bx, by, bw, bh = box_b
+    iw = max(0.0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0.0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union > 0 else 0.0
+
+
+class HybridTracker:
+    """Runs a fast tracker on every frame and re-anchors it with an accurate one.
+
+    The accurate tracker runs on a worker thread and is offered every frame; it
+    takes the newest one whenever it is free, so frames are only skipped while it
+    is busy, and it is never re-seeded from the fast tracker. When the fast
+    tracker failed on that frame or its box overlaps the accurate one by less
+    than min_iou, and the last re-anchor is at least reanchor_interval frames
+    old, a replacement fast tracker is started on that frame with the accurate
+    box and replayed on the worker over the frames seen since. It is swapped in
+    only once it has caught up and did not fail on any of them. While the two
+    trackers agree the fast one is left alone. reanchor_interval can be changed
+    at any time.
+    """
+
+    def __init__(self, fast_type='MEDIANFLOW', accurate_type='CSRT', reanchor_interval=15, min_iou=0.5):
+        self.fast_type = fast_type
+        self.accurate_type = accurate_type
+        self.reanchor_interval = reanchor_interval
+        self.min_iou = min_iou
+        self.fast = None
+        self.accurate = None
+        self.thread = None
+        self.condition = threading.Condition()
+        self.closed = False
+        self.latest = None
+        self.history = []
+        self.replacement = None
+        self.frame_index = 0
+        self.reanchors = 0
+
+    def init(self, frame, bbox):
+        self.close()
+        bbox = tuple(int(v) for v in bbox)
+        self.fast = select_tracker(self.fast_type)
+        self.fast.init(frame, bbox)
+        self.accurate = select_tracker(self.accurate_type)
+        self.accurate.init(frame, bbox)
+        self.closed, self.latest, self.history, self.replacement = False, None, [], None
+        self.frame_index = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return True
+
+    def update(self, frame):
+        self.frame_index += 1
+        with self.condition:
+            # A replacement has been replayed over every frame before this one
+            if self.replacement is not None:
+                self.fast, self.replacement = self.replacement, None
+                self.reanchors += 1
+        ok, bbox = self.fast.update(frame)
+        # Keep a copy for the worker; the caller is free to draw on frame
+        entry = (self.frame_index, frame.copy(), ok, tuple(bbox))
+        with self.condition:
+            self.history.append(entry)
+            self.latest = entry
+            self.condition.notify()
+        return ok, bbox
+
+    def _run(self):
+        anchored_at = 0
+        while True:
+            with self.condition:
+                while self.latest is None and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                index, frame, fast_ok, fast_bbox = self.latest
+                self.latest = None
+                # Replays start after this frame, so nothing older is needed
+                self.history = [entry for entry in self.history if entry[0] > index]
+
+            ok, bbox = self.accurate.update(frame)
+            if not ok or index - anchored_at < max(1, self.reanchor_interval):
+                continue
+            if fast_ok and iou(fast_bbox, bbox) >= self.min_iou:
+                continue
+            fast = select_tracker(self.fast_type)
+            fast.init(frame, tuple(int(v) for v in bbox))
+            if self._replay(fast, index):
+                anchored_at = index
+
+    def _replay(self, fast, index):
+        """Update fast over the frames after index until it has seen them all; False if it fails."""
+        while True:
+            with self.condition:
+                if self.closed:
+                    return False
+                replay = [entry for entry in self.history if entry[0] > index]
+                if not replay:
+                    # Still holding the lock, so update() sees the replacement before its next frame
+                    self.replacement = fast
+                    return True
+            for index, frame, _, _ in replay:
+                ok, _ = fast.update(frame)
+                if not ok:
+                    return False
+
+    def close(self):
+        if self.thread is None:
+            return
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        self.thread = None
+
+
+class CroppedTracker:
+    """Tracks inside a search window around the target instead of the whole frame.
+
+    The tracker sees only a crop of about search_scale times the box size,
+    optionally shrunk by downscale, and boxes are mapped back to full-frame
+    coordinates. OpenCV trackers keep their state in image coordinates, so the
+    window stays put while the target moves inside it. It is moved (with a fresh
+    tracker init) only once the box gets close to an edge that can still move, or
+    changes size, and is then placed ahead of the target's motion so that the
+    next move is as far off as possible. Each re-init restarts the tracker's
+    appearance model from its own last box, so only CROP_TRACKER_TYPES are
+    accepted, and a larger search_scale trades some speed for less drift.
+
+    When the tracker loses the target, a fresh tracker is initialised on the
+    previous full frame where the target is expected to be (the last good box
+    moved on at its last velocity) and updated on the whole current frame. This
+    is retried on each following frame, up to max_lost frames, after which the
+    target is reported lost and update() stops tracking. Tracking returns to a
+    window as soon as a full-frame update succeeds. The previous frame is kept by
+    reference, so draw on a copy of the frames passed to update(), not on the
+    frames themselves.
+    """
+
+    def __init__(self, tracker_type, search_scale=4.0, downscale=1.0, max_lost=10):
+        if tracker_type not in CROP_TRACKER_TYPES:
+            raise ValueError('Search windows are only supported for {}'.format(', '.join(CROP_TRACKER_TYPES)))
+        self.tracker_type = tracker_type
+        self.search_scale = search_scale
+        self.downscale = downscale
+        self.max_lost = max_lost
+        self.tracker = None
+        self.window = None
+        self.anchor_size = None
+        self.last_frame = None
+        self.last_bbox = None
+        self.velocity = (0.0, 0.0)
+        self.frames_lost = 0
+        self.lost = False
+        self.full_frame = False
+        self.recentres = 0
+        self.fallbacks = 0
+
+    def init(self, frame, bbox):
+        self.last_bbox = tuple(float(v) for v in bbox)
+        self.velocity = (0.0, 0.0)
+        self.frames_lost = 0
+        self.lost = False
+        self._recentre(frame, self.last_bbox)
+        self.last_frame = frame
+        return True
+
+    def update(self, frame):
+        ok, bbox = False, (0.0, 0.0, 0.0, 0.0)
+        if self.lost:
+            return ok, bbox
+
+        if self.tracker is not None and not self.full_frame:
+            ok, bbox = self.tracker.update(self._crop(frame))
+            if ok:
+                bbox = self._to_frame(bbox)
+        elif self.tracker is not None:
+            ok, bbox = self.tracker.update(frame)
+        if not ok:
+            ok, bbox = self._fallback(frame)
+
+        if ok:
+            bbox = tuple(float(v) for v in bbox)
+            steps = self.frames_lost + 1
+            self.velocity = ((bbox[0] - self.last_bbox[0]) / steps, (bbox[1] - self.last_bbox[1]) / steps)
+            self.last_bbox = bbox
+            self.frames_lost = 0
+            if self.full_frame or self._needs_recentre(frame.shape, bbox):
+                self._recentre(frame, bbox)
+        else:
+            self.frames_lost += 1
+            if self.frames_lost >= self.max_lost:
+                self.lost = True
+                self.tracker = None
+        self.last_frame = frame
+        return ok, bbox
+
+    def _fallback(self, frame):
+        # Restart on the previous frame where the target should have been, and search the whole
+        # current frame. A tracker that fails here is dropped rather than fed more frames.
+        self.fallbacks += 1
+        x, y, w, h = self.last_bbox
+        vx, vy = self.velocity
+        x, y = x + vx * self.frames_lost, y + vy * self.frames_lost
+        height, width = frame.shape[:2]
+        x = min(max(x, 0), width - w)
+        y = min(max(y, 0), height - h)
+        self.tracker = select_tracker(self.tracker_type)
+        self.tracker.init(self.last_frame, (int(round(x)), int(round(y)), int(round(w)), int(round(h))))
+        self.full_frame = True
+        ok, bbox = self.tracker.update(frame)
+        if not ok:
+            self.tracker = None
+        return ok, bbox
+
+    def _window_for(self, frame_shape, bbox):
+        height, width = frame_shape[:2]
+        x, y, w, h = bbox
+        win_w = min(width, int(round(max(w, 8) * self.search_scale)))
+        win_h = min(height, int(round(max(h, 8) * self.search_scale)))
+        # Lead the target: put it towards the trailing side of the window, still clear of the
+        # re-centre margin, so it has the most room to move before the window has to follow
+        slack_x, slack_y = self._slack(w, h, win_w, win_h)
+        vx, vy = self.velocity
+        lead_x = ((win_w - w) / 2 - slack_x) * ((vx > 0.5) - (vx < -0.5))
+        lead_y = ((win_h - h) / 2 - slack_y) * ((vy > 0.5) - (vy < -0.5))
+        x0 = min(max(int(round(x + w / 2 + lead_x - win_w / 2)), 0), width - win_w)
+        y0 = min(max(int(round(y + h / 2 + lead_y - win_h / 2)), 0), height - win_h)
+        return (x0, y0, win_w, win_h)
+
+    def _recentre(self, frame, bbox):
+        window = self._window_for(frame.shape, bbox)
+        if self.tracker is not None and not self.full_frame and window == self.window:
+            # Pinned against the frame edges: the window can't move, so keep the running tracker
+            return
+        self.window = window
+        self.anchor_size = bbox[2:]
+
+        cx, cy, cw, ch = self._to_crop(bbox)
+        self.tracker = select_tracker(self.tracker_type)
+        self.tracker.init(self._crop(frame), (int(round(cx)), int(round(cy)), max(1, int(round(cw))),
+                                              max(1, int(round(ch)))))
+        self.full_frame = False
+        self.recentres += 1
+
+    @staticmethod
+    def _slack(w, h, win_w, win_h):
+        # Re-centre once the box is within half its own size of a window edge (trackers search
+        # around the box), or has used up half its slack in a tight window
+        return min(w / 2, (win_w - w) / 4), min(h / 2, (win_h - h) / 4)
+
+    def _needs_recentre(self, frame_shape, bbox):
+        height, width = frame_shape[:2]
+        x, y, w, h = bbox
+        x0, y0, win_w, win_h = self.window
+        anchor_w, anchor_h = self.anchor_size
+        if not (0.8 < w / anchor_w < 1.25 and 0.8 < h / anchor_h < 1.25):
+            return True
+        # Edges that coincide with the frame edge can't move, so they never count
+        slack_x, slack_y = self._slack(anchor_w, anchor_h, win_w, win_h)
+        return ((x0 > 0 and x - x0 < slack_x) or (x0 + win_w < width and x0 + win_w - (x + w) < slack_x) or
+                (y0 > 0 and y - y0 < slack_y) or (y0 + win_h < height and y0 + win_h - (y + h) < slack_y))
+
+    def _crop(self, frame):
+        x0, y0, win_w, win_h = self.window
+        crop = frame[y0:y0 + win_h, x0:x0 + win_w]
+        if self.downscale == 1:
+            return crop
+        size = (max(1, int(round(win_w * self.downscale))), max(1, int(round(win_h * self.downscale))))
+        return cv2.resize(crop, size, interpolation=cv2.INTER_AREA)
+
+    def _to_crop(self, bbox):
+        x0, y0 = self.window[:2]
+        x, y, w, h = bbox
+        return ((x - x0) * self.downscale, (y - y0) * self.downscale, w * self.downscale, h * self.downscale)
+
+    def _to_frame(self, bbox):
+        x0, y0 = self.window[:2]
+        x, y, w, h = bbox
+        return (x / self.downscale + x0, y / self.downscale + y0, w / self.downscale, h / self.downscale)
+
+
+def make_tracker(tracker_type, search_scale=None, downscale=1.0):
+    """A plain tracker, or a CroppedTracker when a search_scale is given."""
+    if search_scale is None:
+        return select_tracker(tracker_type)
+    return CroppedTracker(tracker_type, search_scale, downscale)
+
+
+def run_tracker(video_path, tracker, bbox, max_frames=None, realtime=False):
+    """Run an initialised-on-first-frame tracker over a video without display.
+
+    With realtime, frames are handed over no faster than the video's frame rate,
+    as a camera would deliver them, which matters to trackers that do work in the
+    background between frames.
+
+    Returns (boxes, latencies): one (ok, bbox) per frame after the first, and the
+    seconds spent in update() on each of those frames.
+    """
+    video = cv2.VideoCapture(video_path)
+    ok, frame = video.read()
+    if not ok:
+        video.release()
+        raise ValueError("Could not read video file {}".format(video_path))
+    tracker.init(frame, tuple(int(v) for v in bbox))
+    frame_time = 1.0 / (video.get(cv2.CAP_PROP_FPS) or 30.0) if realtime else 0.0
+
+    boxes = []
+    latencies = []
+    due = time.perf_counter()
+    while max_frames is None or len(boxes) < max_frames:
+        ok, frame = video.read()
+        if not ok:
+            break
+        due += frame_time
+        time.sleep(max(0.0, due - time.perf_counter()))
+        start = time.perf_counter()
+        boxes.append(tracker.update(frame))
+        latencies.append(time.perf_counter() - start)
+    video.release()
+    return boxes, latencies
+
+
+def summarise_run(name, boxes, latencies, ground_truth=None):
+    """Speed and accuracy of one run_tracker() result, as a benchmark result row.
+
+    ground_truth holds a box, or None where the target is not visible, for every
+    frame after the first. Invisible frames are left out of the IoU, and frames
+    where the tracker reports failure count as zero IoU.
+    """
+    result = {"tracker": name, "frames": len(boxes), "fps": None, "p50_ms": None, "p90_ms": None,
+              "p99_ms": None, "max_ms": None, "failures": sum(1 for ok, _ in boxes if not ok),
+              "mean_iou": None, "error": None}
+    if latencies:
+        latencies_ms = 1000 * np.array(latencies)
+        p50, p90, p99 = np.percentile(latencies_ms, [50, 90, 99])
+        result.update(fps=round(len(boxes) / sum(latencies), 1), p50_ms=round(p50, 3), p90_ms=round(p90, 3),
+                      p99_ms=round(p99, 3), max_ms=round(latencies_ms.max(), 3))
+    if ground_truth is not None:
+        overlaps = [iou(box, truth) if ok else 0.0
+                    for (ok, box), truth in zip(boxes, ground_truth) if truth is not None]
+        result["mean_iou"] = round(sum(overlaps) / len(overlaps), 4) if overlaps else None
+    return result
+
+
+def compare_hybrid(video_path, bbox, fast_type='MEDIANFLOW', accurate_type='CSRT', reanchor_interval=15,
+                   max_frames=None, ground_truth=None):
+    """Effective FPS and accuracy of the fast, accurate and hybrid trackers on one video.
+
+    The hybrid is fed at the video's frame rate, so its accurate tracker gets the
+    time between frames that it would have on a live camera; the FPS columns
+    still only count time spent in update().
+
+    Returns one summarise_run() row per tracker; the hybrid row also has the
+    number of re-anchors. Accuracy is the mean IoU against ground_truth (a box or
+    None for every frame after the first) if given, otherwise against the
+    accurate tracker running alone, on the frames where it did not fail.
+    """
+    hybrid = HybridTracker(fast_type, accurate_type, reanchor_interval)
+    runs = {
+        fast_type: run_tracker(video_path, select_tracker(fast_type), bbox, max_frames),
+        accurate_type: run_tracker(video_path, select_tracker(accurate_type), bbox, max_frames),
+        "hybrid": run_tracker(video_path, hybrid, bbox, max_frames, realtime=True),
+    }
+    hybrid.close()
+
+    if ground_truth is None:
+        ground_truth = [box if ok else None for ok, box in runs[accurate_type][0]]
+    results = [summarise_run(name, boxes, latencies, ground_truth) for name, (boxes, latencies) in runs.items()]
+    results[-1]["tracker"] = "{}+{}".format(fast_type, accurate_type)
+    results[-1]["reanchors"] = hybrid.reanchors
+    return results
+
+
+def make_synthetic_video(video_path, frames=300, size=(640, 480), box_size=(64, 48), speed=(5.0, 3.0), seed=0):
+    """Write a video of one textured rectangle bouncing over a textured background.
+
+    Returns the ground-truth (x, y, w, h) box for every frame, including the first.
+    """
+    rng = np.random.RandomState(seed)
+    width, height = size
+    box_w, box_h = box_size
+    background = cv2.GaussianBlur(rng.randint(0, 256, (height, width, 3)).astype(np.uint8), (9, 9), 0)
+    target = cv2.GaussianBlur(rng.randint(0, 256, (box_h, box_w, 3)).astype(np.uint8), (3, 3), 0)
+    cv2.rectangle(target, (0, 0), (box_w - 1, box_h - 1), (255, 255, 255), 2)
+
+    writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'mp4v'), 30, size)
+    if not writer.isOpened():
+        raise ValueError("Could not open video writer for {}".format(video_path))
+    x, y = (width - box_w) / 2.0, (height - box_h) / 2.0
+    dx, dy = speed
+    boxes = []
+    for _ in range(frames):
+        frame = background.copy()
+        ix, iy = int(round(x)), int(round(y))
+        frame[iy:iy + box_h, ix:ix + box_w] = target
+        writer.write(frame)
+        boxes.append((ix, iy, box_w, box_h))
+
+        x, y = x + dx, y + dy
+        if not 0 <= x <= width - box_w:
+            dx = -dx
+            x = min(max(x, 0), width - box_w)
+        if not 0 <= y <= height - box_h:
+            dy = -dy
+            y = min(max(y, 0), height - box_h)
+    writer.release()
+    return boxes
+
+
+def read_ground_truth(path):
+    """Read one x,y,w,h box per line (comma, tab or space separated), one line per frame.
+
+    Lines with a zero-sized or NaN box mean the target is not visible and come
+    back as None.
+    """
+    boxes = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            x, y, w, h = [float(v) for v in re.split(r'[,\s]+', line.strip())[:4]]
+            boxes.append((x, y, w, h) if w > 0 and h > 0 else None)
+    return boxes
+
+
+def write_ground_truth(boxes, path):
+    with open(path, 'w') as f:
+        for box in boxes:
+            f.write("{},{},{},{}\n".format(*box))
+
+
+def benchmark_tracker(job):
+    """Run one tracker type over a video and summarise speed and accuracy.
+
+    job is (video_path, tracker_type, init_box, ground_truth, max_frames, crop),
+    where ground_truth is as for summarise_run() or None, and crop is None or the
+    (search_scale, downscale) of a CroppedTracker.
+    """
+    video_path, tracker_type, init_box, ground_truth, max_frames, crop = job
+    try:
+        boxes, latencies = run_tracker(video_path, make_tracker(tracker_type, *(crop or ())), init_box, max_frames)
+    except Exception as e:
+        result = summarise_run(tracker_type, [], [])
+        result["error"] = str(e)
+        return result
+    return summarise_run(tracker_type, boxes, latencies, ground_truth)
+
+
+def flag_iou_loss(results, baseline, tolerance):
+    """Pass results through, marking those whose mean IoU is more than tolerance below baseline.
+
+    baseline maps tracker names to result rows, e.g. the same trackers on the full
+    frame. Every row with a comparable baseline gets baseline_iou and iou_flag.
+    """
+    for result in results:
+        reference = baseline.get(result["tracker"])
+        if reference is not None and result["mean_iou"] is not None and reference["mean_iou"] is not None:
+            result["baseline_iou"] = reference["mean_iou"]
+            result["iou_flag"] = result["mean_iou"] < reference["mean_iou"] - tolerance
+        yield result
+
+
+def _init_worker():
+    # Trackers timed side by side must not also compete through OpenCV's internal threads
+    cv2.setNumThreads(1)
+
+
+def run_benchmark(video_path, init_box, ground_truth=None, tracker_types=TRACKER_TYPES, max_frames=None,
+                  workers=1, crop=None):
+    """Benchmark each tracker type, yielding results as they finish.
+
+    With workers > 1 the trackers run in parallel processes. That finishes
+    sooner, but the trackers then compete for cores and memory bandwidth, so
+    use workers=1 when the absolute FPS figures matter.
+    """
+    jobs = [(video_path, tracker_type, tuple(init_box), ground_truth, max_frames, crop)
+            for tracker_type in tracker_types]
+    if workers <= 1:
+        for job in jobs:
+            yield benchmark_tracker(job)
+        return
+    with multiprocessing.Pool(workers, initializer=_init_worker) as pool:
+        for result in pool.imap_unordered(benchmark_tracker, jobs):
+            yield result
+
+
+def write_results(results, results_file):
+    """Write benchmark rows to a JSONL file, or to CSV for any other extension."""
+    with open(results_file, 'w', newline='') as f:
+        if results_file.lower().endswith('.jsonl'):
+            f.writelines(json.dumps(result) + "\n" for result in results)
+            return
+        fields = ["tracker", "frames", "fps", "p50_ms", "p90_ms", "p99_ms", "max_ms", "failures", "mean_iou",
+                  "baseline_iou", "iou_flag", "error"]
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def print_result(result):
+    if result["error"]:
+        print("{:<11} error: {}".format(result["tracker"], result["error"]))
+        return
+    # A run with no timed frames has no speed figures, and one without ground truth has no IoU
+    def number(key, width, digits):
+        return "-".rjust(width) if result[key] is None else "{:>{}.{}f}".format(result[key], width, digits)
+
+    print("{:<11} {:>5} frames {} fps  p50 {} ms  p90 {} ms  p99 {} ms  failures {:>4}  IoU {}".format(
+        result["tracker"], result["frames"], number("fps", 8, 1), number("p50_ms", 7, 2), number("p90_ms", 7, 2),
+        number("p99_ms", 7, 2), result["failures"], number("mean_iou", 5, 3)))
+    if result.get("iou_flag"):
+        print("{:<11} flagged: IoU on the full frame was {:.3f}".format("", result["baseline_iou"]))
+
+
+def parse_box(text):
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 4:
+        raise argparse.ArgumentTypeError("expected x,y,w,h")
+    return tuple(values)
+
+
+def benchmark_main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every tracker type on a video without any interaction.")
+    parser.add_argument("video", nargs="?", help="video file to track in")
+    parser.add_argument("--box", type=parse_box, help="initial box on the first frame as x,y,w,h")
+    parser.add_argument("--ground-truth", help="file with one x,y,w,h box per frame; its first line is the "
+                                               "initial box unless --box is given")
+    parser.add_argument("--synthetic", metavar="VIDEO",
+                        help="first write a synthetic moving-rectangle video (and VIDEO.txt ground truth) here")
+    parser.add_argument("--frames", type=int, default=300, help="length of the synthetic video")
+    parser.add_argument("--size", default="640x480", help="frame size of the synthetic video, e.g. 3840x2160")
+    parser.add_argument("--trackers", help="comma-separated tracker types (default: all, or all that support "
+                                           "--crop)")
+    parser.add_argument("--max-frames", type=int, help="stop each run after this many frames")
+    parser.add_argument("--crop", type=float, metavar="SCALE",
+                        help="track in a search window SCALE times the box size instead of the full frame")
+    parser.add_argument("--downscale", type=float, default=1.0, help="shrink the search window by this factor")
+    parser.add_argument("--iou-tolerance", type=float, default=0.05,
+                        help="with --crop, flag trackers whose IoU is more than this below the full frame's")
+    parser.add_argument("--hybrid", metavar="FAST,ACCURATE",
+                        help="instead, compare a hybrid tracker with its two trackers running alone")
+    parser.add_argument("--reanchor", type=int, default=15, help="minimum frames between hybrid re-anchors")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="run trackers in this many parallel processes (skews FPS)")
+    parser.add_argument("-o", "--output", help="also write results to this file (.csv or .jsonl)")
+    args = parser.parse_args(argv)
+
+    video_path, ground_truth_path = args.video, args.ground_truth
+    if args.synthetic:
+        video_path = args.synthetic
+        ground_truth_path = os.path.splitext(video_path)[0] + ".txt"
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        # Keep the target the same fraction of the frame at any resolution
+        scale = width / 640.0
+        boxes = make_synthetic_video(video_path, frames=args.frames, size=(width, height),
+                                     box_size=(int(64 * scale), int(48 * scale)), speed=(5.0 * scale, 3.0 * scale))
+        write_ground_truth(boxes, ground_truth_path)
+        print("Wrote {} and {}".format(video_path, ground_truth_path))
+    if not video_path:
+        parser.error("a video or --synthetic is required")
+
+    ground_truth = read_ground_truth(ground_truth_path) if ground_truth_path else None
+    init_box = args.box
+    if init_box is None:
+        if not ground_truth or ground_truth[0] is None:
+            parser.error("--box is required without a ground-truth file whose first box is visible")
+        init_box = ground_truth[0]
+    if ground_truth is not None:
+        ground_truth = ground_truth[1:]
+
+    default_types = CROP_TRACKER_TYPES if args.crop else TRACKER_TYPES
+    tracker_types = [t.strip().upper() for t in (args.hybrid or args.trackers or ",".join(default_types)).split(',')
+                     if t.strip()]
+    for tracker_type in tracker_types:
+        if tracker_type not in TRACKER_TYPES:
+            parser.error("unknown tracker type {}".format(tracker_type))
+        if args.crop and not args.hybrid and tracker_type not in CROP_TRACKER_TYPES:
+            parser.error("--crop only supports {}".format(", ".join(CROP_TRACKER_TYPES)))
+
+    if args.hybrid:
+        if len(tracker_types) != 2:
+            parser.error("--hybrid takes two tracker types, FAST,ACCURATE")
+        results = compare_hybrid(video_path, init_box, tracker_types[0], tracker_types[1], args.reanchor,
+                                 args.max_frames, ground_truth)
+        if ground_truth is None:
+            print("No ground truth: IoU is measured against {} running alone".format(tracker_types[1]))
+        print("{} re-anchors, at most every {} frames".format(results[-1]["reanchors"], args.reanchor))
+    else:
+        crop = (args.crop, args.downscale) if args.crop else None
+        results = run_benchmark(video_path, init_box, ground_truth, tracker_types, args.max_frames, args.workers,
+                                crop)
+        if crop and ground_truth is None:
+            print("No ground truth: search-window accuracy is not checked against the full frame")
+        elif crop:
+            print("Running the full-frame baseline first")
+            baseline = {result["tracker"]: result for result in run_benchmark(
+                video_path, init_box, ground_truth, tracker_types, args.max_frames, args.workers)}
+            results = flag_iou_loss(results, baseline, args.iou_tolerance)
+    rows = []
+    for result in results:
+        print_result(result)
+        rows.append(result)
+    if args.output:
+        write_results(rows, args.output)
+    return 0
+
+
+def track_multiple(video, frame, tracker_type, bboxes):
+    """Track several boxes at once, showing each track and the per-frame update cost."""
+    multi_tracker = MultiObjectTracker(tracker_type)
+    for bbox in bboxes:
+        multi_tracker.add(frame, bbox)
+
+    while True:
+        ok, frame = video.read()
+        if not ok:
+            break
+
+        tracks = multi_tracker.update(frame)
+        for track_id, (ok, bbox) in tracks.items():
+            p1 = (int(bbox[0]), int(bbox[1]))
+            p2 = (int(bbox[0] + bbox[2]), int(bbox[1] + bbox[3]))
+            cv2.rectangle(frame, p1, p2, (255,0,0) if ok else (0,0,255), 2, 1)
+            cv2.putText(frame, str(track_id), p1, cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255,0,0), 1)
+
+        stats = multi_tracker.stats()
+        cv2.putText(frame, "{} Tracker, {} objects".format(tracker_type, stats["tracks"]), (100,20),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
+        cv2.putText(frame, "update {:.1f} ms, CPU {:.0f}%".format(stats["last_update_ms"], stats["last_cpu_percent"]),
+                    (100,50), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
+
+        cv2.imshow("Tracking", frame)
+
+        if cv2.waitKey(1) & 0xFF == 27:  # Exit on ESC
+            break
+
+    print("Multi-object tracking stats: {}".format(multi_tracker.stats()))
+    multi_tracker.close()
+
+
 def main():
-    tracker_types = ['BOOSTING', 'MIL', 'KCF', 'TLD', 'MEDIANFLOW', 'MOSSE', 'CSRT']
+    tracker_types = TRACKER_TYPES
     print("Select tracker type:")
     for i, t_type in enumerate(tracker_types, start=1):
         print("{}. {}".format(i, t_type))
@@ -28,7 +762,19 @@ def main():
     tracker_choice = int(input("Enter tracker number: ")) - 1
     tracker_type = tracker_types[tracker_choice]
     
-    tracker = select_tracker(tracker_type)
+    # Hybrid and search-window tracking are single-object modes, so only offer them for one object
+    multiple = input("Track multiple objects? (y/N): ").strip().lower() == 'y'
+    if multiple:
+        tracker = None
+    elif input("Re-anchor with CSRT in the background (hybrid mode)? (y/N): ").strip().lower() == 'y':
+        interval = int(input("Re-anchor at most every N frames [15]: ") or 15)
+        tracker = HybridTracker(fast_type=tracker_type, accurate_type='CSRT', reanchor_interval=interval)
+    elif (tracker_type in CROP_TRACKER_TYPES and
+          input("Track in a search window around the target? (y/N): ").strip().lower() == 'y'):
+        downscale = float(input("Downscale the window by [1.0]: ") or 1.0)
+        tracker = CroppedTracker(tracker_type, downscale=downscale)
+    else:
+        tracker = select_tracker(tracker_type)
 
     video_path = input("Enter video file path (leave blank for webcam): ")
     if not video_path:
@@ -45,6 +791,13 @@ def main():
         print("Error: Could not read video file.")
         sys.exit()
 
+    if multiple:
+        bboxes = cv2.selectROIs("Tracking", frame, False)
+        track_multiple(video, frame, tracker_type, bboxes)
+        video.release()
+        cv2.destroyAllWindows()
+        return
+
     bbox = cv2.selectROI(frame, False)
     
     ok = tracker.init(frame, bbox)
@@ -55,6 +808,9 @@ def main():
             break
 
         ok, bbox = tracker.update(frame)
+        if isinstance(tracker, CroppedTracker):
+            # The cropped tracker keeps this frame for its full-frame fallback, so draw on a copy
+            frame = frame.copy()
 
         if ok:
             p1 = (int(bbox[0]), int(bbox[1]))
@@ -63,16 +819,30 @@ def main():
         else:
             cv2.putText(frame, "Tracking failure detected", (100,80), cv2.FONT_HERSHEY_SIMPLEX, 0.75,(0,0,255),2)
 
-        cv2.putText(frame, tracker_type + " Tracker", (100,20), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
+        if isinstance(tracker, HybridTracker):
+            label = "{}+{} Tracker, re-anchor at most every {} (+/-)".format(
+                tracker_type, tracker.accurate_type, tracker.reanchor_interval)
+        else:
+            label = tracker_type + " Tracker"
+        cv2.putText(frame, label, (100,20), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
         cv2.putText(frame, "ESC to quit", (100,50), cv2.FONT_HERSHEY_SIMPLEX, 0.75, (50,170,50),2)
 
         cv2.imshow("Tracking", frame)
         
-        if cv2.waitKey(1) & 0xFF == 27:  # Exit on ESC
+        key = cv2.waitKey(1) & 0xFF
+        if key == 27:  # Exit on ESC
             break
+        if isinstance(tracker, HybridTracker) and key in (ord('+'), ord('=')):
+            tracker.reanchor_interval += 5
+        elif isinstance(tracker, HybridTracker) and key == ord('-'):
+            tracker.reanchor_interval = max(1, tracker.reanchor_interval - 5)
 
+    if isinstance(tracker, HybridTracker):
+        tracker.close()
     video.release()
     cv2.destroyAllWindows()
 
 if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        sys.exit(benchmark_main())
     main()